@@ -11,12 +11,12 @@
     4.  increment_error: статус paused сохраняется в БД
     5.  increment_error: paused URL отсутствует в get_urls_for_platform
     6.  increment_error: несуществующий task_id → None (без краша)
-    7.  _send_pause_notification: отправляется каждому chat_id
+    7.  _send_pause_notification: в очередь ставится сообщение на каждый chat_id
     8.  _send_pause_notification: текст содержит task_id
     9.  _send_pause_notification: inline-кнопки resume / stop
-    10. _send_pause_notification: без tg_token — не отправляем
-    11. _send_pause_notification: без chat_ids — не отправляем
-    12. _send_pause_notification: ошибка API не крашит процесс
+    10. _send_pause_notification: без tg_token — ничего не ставим в очередь
+    11. _send_pause_notification: без chat_ids — ничего не ставим в очередь
+    12. _send_pause_notification: ошибка API в фоновом воркере не крашит процесс
     13. record_check: сбрасывает счётчик ошибок
     14. record_check: аккумулирует notifications_sent
     15. record_check: обновляет last_check
@@ -27,7 +27,7 @@ import os
 import sqlite3
 import sys
 import tempfile
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, patch
 
 from loguru import logger
 
@@ -113,7 +113,8 @@ def test_increment_error():
         )
         check("Snapshot статус = paused", snapshot is not None and snapshot.get("status") == "paused")
 
-        # Тест 4: статус persisted в БД
+        # Тест 4: статус persisted в БД (запись фоновая — сбрасываем явно)
+        state.flush()
         with sqlite3.connect(tmp_db) as conn:
             row = conn.execute(
                 "SELECT status FROM monitored_urls WHERE task_id='task_test'"
@@ -122,7 +123,7 @@ def test_increment_error():
 
         # Тест 5: paused URL не возвращается в get_urls_for_platform
         active = state.get_urls_for_platform("avito")
-        check("Paused URL отсутствует в списке активных", not any(u["task_id"] == "task_test" for u in active))
+        check("Paused URL отсутствует в списке активных", not any(u.task_id == "task_test" for u in active))
 
         # Тест 6: несуществующий task_id — graceful
         result = state.increment_error("nonexistent", "err")
@@ -135,40 +136,34 @@ def test_increment_error():
 
 async def test_send_pause_notification():
     logger.info("\n── 7–12. _send_pause_notification ──")
+    import monitor
     from monitor import _send_pause_notification
 
-    def _mock_http_client(post_mock):
-        """Возвращает контекстный менеджер-мок httpx.AsyncClient"""
-        mock_resp = MagicMock()
-        mock_resp.raise_for_status = MagicMock()
-        post_mock.return_value = mock_resp
-        client = AsyncMock()
-        client.post = post_mock
-        client.__aenter__ = AsyncMock(return_value=client)
-        client.__aexit__ = AsyncMock(return_value=False)
-        return client
+    # _send_pause_notification только ставит сообщения в очередь (_enqueue_tg):
+    # проверяем, что именно поставлено, payload — второй позиционный аргумент
 
     # Тест 7: отправляется каждому chat_id
     url_data = {
         "task_id": "avito_abc123",
         "config": {"tg_token": "bot_token", "tg_chat_id": ["111", "222", "333"]},
     }
-    post_mock = AsyncMock()
-    client = _mock_http_client(post_mock)
-    with patch("monitor.httpx.AsyncClient", return_value=client):
+    with patch("monitor._enqueue_tg") as enqueue_mock:
         await _send_pause_notification(url_data)
-    check("Отправляется 3 сообщения (по chat_id)", post_mock.call_count == 3)
+    check("Ставится 3 сообщения (по chat_id)", enqueue_mock.call_count == 3)
+    check(
+        "Каждому chat_id — своё сообщение",
+        sorted(c.args[1]["chat_id"] for c in enqueue_mock.call_args_list) == ["111", "222", "333"]
+    )
 
     # Тест 8: текст содержит task_id
     url_data = {
         "task_id": "avito_UNIQUE_ID",
         "config": {"tg_token": "token", "tg_chat_id": ["123"]},
     }
-    post_mock = AsyncMock()
-    client = _mock_http_client(post_mock)
-    with patch("monitor.httpx.AsyncClient", return_value=client):
+    with patch("monitor._enqueue_tg") as enqueue_mock:
         await _send_pause_notification(url_data)
-    call_json = post_mock.call_args_list[0][1]["json"]
+    url, call_json, _ = enqueue_mock.call_args.args
+    check("Адрес sendMessage бота", url == "https://api.telegram.org/bottoken/sendMessage")
     check("Текст содержит task_id", "avito_UNIQUE_ID" in call_json["text"])
     check("parse_mode=HTML", call_json.get("parse_mode") == "HTML")
 
@@ -177,11 +172,9 @@ async def test_send_pause_notification():
         "task_id": "task_XYZ",
         "config": {"tg_token": "token", "tg_chat_id": ["123"]},
     }
-    post_mock = AsyncMock()
-    client = _mock_http_client(post_mock)
-    with patch("monitor.httpx.AsyncClient", return_value=client):
+    with patch("monitor._enqueue_tg") as enqueue_mock:
         await _send_pause_notification(url_data)
-    body = post_mock.call_args_list[0][1]["json"]
+    body = enqueue_mock.call_args.args[1]
     buttons = body.get("reply_markup", {}).get("inline_keyboard", [[]])[0]
     callbacks = [btn.get("callback_data", "") for btn in buttons]
     check(
@@ -194,25 +187,25 @@ async def test_send_pause_notification():
     )
     check("Есть inline_keyboard", len(buttons) >= 2)
 
-    # Тест 10: без tg_token → не вызывает AsyncClient
+    # Тест 10: без tg_token → ничего не ставится в очередь
     url_data_no_token = {
         "task_id": "t1",
         "config": {"tg_token": None, "tg_chat_id": ["123"]},
     }
-    with patch("monitor.httpx.AsyncClient") as cls_mock:
+    with patch("monitor._enqueue_tg") as enqueue_mock:
         await _send_pause_notification(url_data_no_token)
-    check("Без tg_token → AsyncClient не создаётся", not cls_mock.called)
+    check("Без tg_token → в очередь ничего не ставится", not enqueue_mock.called)
 
-    # Тест 11: без chat_ids → не вызывает AsyncClient
+    # Тест 11: без chat_ids → ничего не ставится в очередь
     url_data_no_chats = {
         "task_id": "t2",
         "config": {"tg_token": "token", "tg_chat_id": []},
     }
-    with patch("monitor.httpx.AsyncClient") as cls_mock:
+    with patch("monitor._enqueue_tg") as enqueue_mock:
         await _send_pause_notification(url_data_no_chats)
-    check("Без chat_ids → AsyncClient не создаётся", not cls_mock.called)
+    check("Без chat_ids → в очередь ничего не ставится", not enqueue_mock.called)
 
-    # Тест 12: ошибка Telegram API не крашит процесс
+    # Тест 12: ошибка Telegram API не крашит процесс — через настоящую очередь и воркер
     url_data_err = {
         "task_id": "t3",
         "config": {"tg_token": "token", "tg_chat_id": ["123"]},
@@ -220,14 +213,17 @@ async def test_send_pause_notification():
     post_mock_err = AsyncMock(side_effect=Exception("Telegram unavailable"))
     client_err = AsyncMock()
     client_err.post = post_mock_err
-    client_err.__aenter__ = AsyncMock(return_value=client_err)
-    client_err.__aexit__ = AsyncMock(return_value=False)
     crashed = False
+    await monitor.close_tg_notifier()  # клиент создастся заново — уже из мока
     try:
         with patch("monitor.httpx.AsyncClient", return_value=client_err):
             await _send_pause_notification(url_data_err)
+            await asyncio.wait_for(monitor._tg_queue.join(), timeout=5)
     except Exception:
         crashed = True
+    finally:
+        await monitor.close_tg_notifier()
+    check("Воркер дошёл до отправки", post_mock_err.call_count == 1)
     check("Ошибка Telegram API не крашит процесс", not crashed)
 
 
@@ -262,7 +258,8 @@ def test_record_check():
         check("last_check не None после record_check",
               state.get_url_data("task_test")["last_check"] is not None)
 
-        # Тест 16: статистика сохраняется в БД
+        # Тест 16: статистика сохраняется в БД (пишется пачкой — сбрасываем явно)
+        state.flush()
         with sqlite3.connect(tmp_db) as conn:
             row = conn.execute(
                 "SELECT notifications_sent, last_check FROM monitored_urls WHERE task_id='task_test'"
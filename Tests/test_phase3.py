@@ -23,7 +23,7 @@ async def test_queue_basic():
     logger.info("ТЕСТ 1: Базовая работа очереди")
     logger.info("=" * 60)
 
-    from notification_queue import NotificationQueue
+    from notification_queue import NotificationQueue, TwoPriorityQueue
 
     # Создаём отдельный экземпляр (не singleton) для теста
     queue = NotificationQueue.__new__(NotificationQueue)
@@ -31,7 +31,7 @@ async def test_queue_basic():
     queue.__init__()
 
     # Переопределяем singleton для изоляции теста
-    queue.queue = asyncio.PriorityQueue(maxsize=100)
+    queue.queue = TwoPriorityQueue(maxsize=100)
     queue.running = False
 
     await queue.start()
@@ -71,59 +71,50 @@ async def test_priority_ordering():
     logger.info("ТЕСТ 2: Приоритизация сообщений")
     logger.info("=" * 60)
 
-    from notification_queue import NotificationItem, PRIORITY_SYSTEM, PRIORITY_AD
+    from notification_queue import TwoPriorityQueue, PRIORITY_SYSTEM, PRIORITY_AD
 
-    queue = asyncio.PriorityQueue()
+    queue = TwoPriorityQueue()
 
     # Добавляем в обратном порядке: сначала ads (приоритет 1), потом system (приоритет 0)
-    ad_item = NotificationItem(
-        priority=PRIORITY_AD,
-        timestamp=time.time(),
-        data={"type": "ad", "msg": "Новое объявление"}
-    )
-    system_item = NotificationItem(
-        priority=PRIORITY_SYSTEM,
-        timestamp=time.time(),
-        data={"type": "system", "msg": "Ошибка!"}
-    )
-
-    await queue.put(ad_item)
-    await queue.put(system_item)
+    queue.put_nowait((PRIORITY_AD, {"type": "ad", "msg": "Новое объявление"}))
+    queue.put_nowait((PRIORITY_SYSTEM, {"type": "system", "msg": "Ошибка!"}))
 
     # Первым должен выйти system (приоритет 0)
     first = await queue.get()
     second = await queue.get()
 
-    if first.priority == PRIORITY_SYSTEM and second.priority == PRIORITY_AD:
+    if first[0] == PRIORITY_SYSTEM and second[0] == PRIORITY_AD:
         logger.success("✓ Системные сообщения приоритетнее объявлений")
     else:
-        logger.error(f"✗ Неверный порядок: first={first.priority}, second={second.priority}")
+        logger.error(f"✗ Неверный порядок: first={first[0]}, second={second[0]}")
         return False
 
     return True
 
 
 async def test_rate_limiting():
-    """Тест 3: Rate limiting (35мс между сообщениями)"""
+    """Тест 3: Rate limiting (token bucket, 30 msg/sec на бота)"""
     logger.info("\n" + "=" * 60)
     logger.info("ТЕСТ 3: Rate limiting")
     logger.info("=" * 60)
 
-    from notification_queue import TELEGRAM_RATE_LIMIT_INTERVAL
+    from notification_queue import TokenBucket, TELEGRAM_BOT_RATE
 
-    # Имитация отправки 10 сообщений с rate limiting
-    count = 10
+    # Первые TELEGRAM_BOT_RATE — всплеском, следующие 10 — по 1/rate секунды
+    bucket = TokenBucket(TELEGRAM_BOT_RATE, TELEGRAM_BOT_RATE)
+    extra = 10
+    count = TELEGRAM_BOT_RATE + extra
     start = time.time()
 
     for _ in range(count):
-        await asyncio.sleep(TELEGRAM_RATE_LIMIT_INTERVAL)
+        await bucket.acquire()
 
     elapsed = time.time() - start
-    expected_min = count * TELEGRAM_RATE_LIMIT_INTERVAL * 0.8  # 20% погрешность
+    expected_min = extra / TELEGRAM_BOT_RATE * 0.8  # 20% погрешность
 
     logger.info(f"  {count} сообщений за {elapsed:.3f}с")
     logger.info(f"  Ожидаемый минимум: {expected_min:.3f}с")
-    logger.info(f"  Интервал: {TELEGRAM_RATE_LIMIT_INTERVAL * 1000:.0f}мс = ~{1/TELEGRAM_RATE_LIMIT_INTERVAL:.0f} msg/sec")
+    logger.info(f"  Лимит: {TELEGRAM_BOT_RATE} msg/sec (всплеск до {TELEGRAM_BOT_RATE})")
 
     if elapsed >= expected_min:
         logger.success("✓ Rate limiting работает корректно")
@@ -140,13 +131,13 @@ async def test_enqueue_methods():
     logger.info("ТЕСТ 4: Методы enqueue")
     logger.info("=" * 60)
 
-    from notification_queue import NotificationQueue, PRIORITY_AD, PRIORITY_SYSTEM
+    from notification_queue import NotificationQueue, TwoPriorityQueue, PRIORITY_AD, PRIORITY_SYSTEM
 
     # Создаём изолированный экземпляр
     queue = NotificationQueue.__new__(NotificationQueue)
     queue._initialized = False
     queue.__init__()
-    queue.queue = asyncio.PriorityQueue(maxsize=100)
+    queue.queue = TwoPriorityQueue(maxsize=100)
 
     # Без запуска consumer — просто проверяем что элементы добавляются
 
@@ -161,7 +152,7 @@ async def test_enqueue_methods():
     mock_ad = MagicMock()
     mock_ad.id = 12345
 
-    await queue.enqueue_ad(ad=mock_ad, user_config=user_config, platform="avito")
+    queue.enqueue_ad(ad=mock_ad, user_config=user_config, platform="avito")
 
     if queue.queue.qsize() == 1:
         logger.success("✓ enqueue_ad добавил 1 элемент")
@@ -170,7 +161,7 @@ async def test_enqueue_methods():
         return False
 
     # enqueue_system_message
-    await queue.enqueue_system_message(
+    queue.enqueue_system_message(
         msg="Тестовое системное сообщение",
         bot_token="test_token",
         chat_ids=["123456"]
@@ -184,14 +175,14 @@ async def test_enqueue_methods():
 
     # Проверяем приоритет: system (0) должен быть первым
     first = await queue.queue.get()
-    if first.priority == PRIORITY_SYSTEM:
+    if first[0] == PRIORITY_SYSTEM:
         logger.success("✓ Системное сообщение первое в очереди")
     else:
-        logger.error(f"✗ Первым оказался приоритет {first.priority}")
+        logger.error(f"✗ Первым оказался приоритет {first[0]}")
         return False
 
     # enqueue_ad без tg_token — должен пропустить
-    await queue.enqueue_ad(ad=mock_ad, user_config={"tg_token": None}, platform="avito")
+    queue.enqueue_ad(ad=mock_ad, user_config={"tg_token": None}, platform="avito")
     if queue.queue.qsize() == 1:  # только ad-item остался
         logger.success("✓ enqueue_ad пропускает без tg_token")
     else:
@@ -207,17 +198,17 @@ async def test_graceful_shutdown():
     logger.info("ТЕСТ 5: Graceful shutdown")
     logger.info("=" * 60)
 
-    from notification_queue import NotificationQueue
+    from notification_queue import NotificationQueue, TwoPriorityQueue
 
     queue = NotificationQueue.__new__(NotificationQueue)
     queue._initialized = False
     queue.__init__()
-    queue.queue = asyncio.PriorityQueue(maxsize=100)
+    queue.queue = TwoPriorityQueue(maxsize=100)
 
     await queue.start()
 
     # Добавляем системное сообщение (не будет отправлено — test token)
-    await queue.enqueue_system_message(
+    queue.enqueue_system_message(
         msg="shutdown test",
         bot_token="invalid_token",
         chat_ids=["123"]
@@ -233,14 +233,17 @@ async def test_process_url_fetch_layer():
     logger.info("\n── 9–11. AvitoMonitor._process_url: fetch-слой ──")
 
     from monitor import AvitoMonitor
-
-    url_data = {
-        "url": "https://www.avito.ru/test",
-        "user_id": 123,
-        "task_id": "t1",
-        "config": {},
-        "started_at": 0,
-    }
+    from state_manager import UrlSnapshot
+
+    url_data = UrlSnapshot(
+        task_id="t1",
+        url="https://www.avito.ru/test",
+        platform="avito",
+        user_id=123,
+        config={},
+        status="active",
+        started_at=0,
+    )
 
     def _make_avito():
         m = object.__new__(AvitoMonitor)
@@ -2,8 +2,10 @@ from fastapi import FastAPI, BackgroundTasks, HTTPException
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import asyncio
+import gc
 import os
 import signal
+import sys
 import time
 from datetime import datetime, timezone  # ✅ ДОБАВЛЕНО: timezone
 from loguru import logger
@@ -35,9 +37,12 @@ async def lifespan(app: FastAPI):
     logger.info("ЗАПУСК СЕРВИСА: Realty Parser (Phase 2 - Monitoring Mode)")
     logger.info("=" * 60)
 
+    logger.info(f"Event loop: {type(asyncio.get_running_loop()).__module__}")
+
     # Startup: запуск очереди уведомлений и мониторов
-    from monitor import avito_monitor, cian_monitor
+    from monitor import avito_monitor, cian_monitor, close_tg_notifier
     from notification_queue import notification_queue
+    from proxy_manager import proxy_manager
 
     logger.info("Запуск очереди уведомлений...")
     await notification_queue.start()
@@ -47,6 +52,10 @@ async def lifespan(app: FastAPI):
     await cian_monitor.start()
     logger.success("Мониторы и очередь уведомлений запущены")
 
+    # Один раз за процесс: всё созданное к старту (модули, модели, синглтоны) живёт
+    # до конца — выводим из отслеживания GC, сборки при всплесках объявлений короче
+    gc.freeze()
+
     yield
 
     # Shutdown: остановка мониторов, затем очереди
@@ -54,14 +63,19 @@ async def lifespan(app: FastAPI):
     logger.info("ОСТАНОВКА СЕРВИСА")
     logger.info("=" * 60)
 
-    # Сначала обновляем статусы всех задач в БД (graceful shutdown)
+    # Сначала мониторы: пока они работают, record_check/increment_error/автопауза
+    # ставят записи в очередь state_manager, а stop_all_tasks останавливает её флашер
+    logger.info("Остановка мониторов...")
+    await avito_monitor.stop()
+    await cian_monitor.stop()
+
+    # Затем статусы всех задач в БД (graceful shutdown) — с финальным сбросом очереди
     logger.info("Обновление статусов задач в БД...")
     stopped_count = monitoring_state.stop_all_tasks()
     logger.info(f"✅ Обновлено {stopped_count} задач в статус 'suspended' (восстановятся после рестарта)")
 
-    logger.info("Остановка мониторов...")
-    await avito_monitor.stop()
-    await cian_monitor.stop()
+    await close_tg_notifier()
+    await proxy_manager.aclose()
 
     logger.info("Остановка очереди уведомлений...")
     await notification_queue.stop()
@@ -416,6 +430,15 @@ async def update_proxy_config(request: ProxyUpdateRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/admin/proxy/resume")
+async def resume_proxy():
+    """Сбросить FAILED и прервать cooldown ProxyManager — мониторы продолжат без ожидания"""
+    from proxy_manager import proxy_manager
+    proxy_manager.reset_failed()
+    logger.info("ProxyManager: возобновление по команде администратора")
+    return {"status": "ok", "proxy": proxy_manager.get_status()}
+
+
 @app.post("/admin/restart")
 async def restart_service():
     """Перезапустить сервис — Docker поднимет его заново с обновлёнными настройками"""
@@ -442,4 +465,14 @@ async def global_exception_handler(request, exc):
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8009)
\ No newline at end of file
+    # uvloop ставится с uvicorn[standard] (кроме Windows) — мониторы и очередь
+    # уведомлений целиком на asyncio, libuv-цикл заметно дешевле на create_task/sleep
+    loop_impl = "asyncio"
+    if sys.platform != "win32":
+        try:
+            import uvloop  # noqa: F401
+            loop_impl = "uvloop"
+        except ImportError:
+            pass
+
+    uvicorn.run(app, host="0.0.0.0", port=8009, loop=loop_impl)
\ No newline at end of file
@@ -1,11 +1,11 @@
 import asyncio
 import html
-import json
 import random
 import re
 import time
 from urllib.parse import unquote, urlparse, parse_qs, urlencode, urlunparse
 from datetime import datetime, timedelta
+from typing import Iterable, Iterator
 
 from bs4 import BeautifulSoup
 from curl_cffi import requests
@@ -25,6 +25,13 @@ from vk_sender import SendAdToVK
 from version import VERSION
 from xlsx_service import XLSXHandler
 
+# orjson в 2-5 раз быстрее stdlib на JSON-состоянии страницы (сотни КБ);
+# без него (например, нет колеса под платформу) работает json из stdlib
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
 DEBUG_MODE = False
 
 logger.add("logs/app.log", rotation="5 MB", retention="5 days", level="DEBUG")
@@ -173,7 +180,19 @@ class AvitoParse:
                     return None
 
     def parse(self):
+        try:
+            self._parse_urls()
+        finally:
+            self._flush_xlsx()
+
+    def _flush_xlsx(self) -> None:
+        """Дописывает на диск то, что XLSXHandler ещё держит в памяти"""
+        if self.xlsx_handler:
+            self.xlsx_handler.flush()
+
+    def _parse_urls(self):
         if self.config.one_file_for_link:
+            self._flush_xlsx()
             self.xlsx_handler = None
 
         for _index, url in enumerate(self.config.urls):
@@ -198,7 +217,7 @@ class AvitoParse:
                 data_from_page = self.find_json_on_page(html_code=html_code)
                 try:
                     catalog = data_from_page.get("data", {}).get("catalog") or {}
-                    ads_models = ItemsResponse(**catalog)
+                    ads_models = ItemsResponse.model_validate(catalog)
                 except ValidationError as err:
                     logger.error(f"При валидации объявлений произошла ошибка: {err}")
                     continue
@@ -239,6 +258,7 @@ class AvitoParse:
                 logger.info("Сохранять нечего")
 
             if self.config.one_file_for_link:
+                self._flush_xlsx()
                 self.xlsx_handler = None
 
         logger.info(f"Хорошие запросы: {self.good_request_count}шт, плохие: {self.bad_request_count}шт")
@@ -256,7 +276,48 @@ class AvitoParse:
         return [ad for ad in ads if ad.id]
 
     @staticmethod
-    def find_json_on_page(html_code, data_type: str = "mime") -> dict:
+    def _slice_mime_script(html_code: str | bytes) -> str | None:
+        """Содержимое первого <script type="mime/invalid"> без разбора всей страницы.
+
+        Ищет по сырым bytes ответа, декодирует только найденный кусок.
+        None — маркер не найден (разметка изменилась), нужен полный разбор.
+        """
+        if isinstance(html_code, str):
+            marker, tag_end, close = 'type="mime/invalid"', ">", "</script>"
+        else:
+            marker, tag_end, close = b'type="mime/invalid"', b">", b"</script>"
+
+        start = html_code.find(marker)
+        if start == -1:
+            return None
+        start = html_code.find(tag_end, start)
+        end = html_code.find(close, start)
+        if start == -1 or end == -1:
+            return None
+
+        chunk = html_code[start + 1:end]
+        return chunk if isinstance(chunk, str) else chunk.decode("utf-8")
+
+    @staticmethod
+    def _unwrap_state(parsed_data: dict) -> dict:
+        if 'state' in parsed_data:
+            return parsed_data['state']
+        elif 'data' in parsed_data:
+            logger.info("data")
+            return parsed_data['data']
+        return parsed_data
+
+    @staticmethod
+    def find_json_on_page(html_code: str | bytes, data_type: str = "mime") -> dict:
+        """Ищет JSON-состояние страницы; принимает как str, так и сырые bytes ответа"""
+        if data_type == 'mime':
+            try:
+                script_content = AvitoParse._slice_mime_script(html_code)
+                if script_content is not None:
+                    return AvitoParse._unwrap_state(_json.loads(html.unescape(script_content)))
+            except Exception as err:
+                logger.debug(f"Быстрый поиск JSON не удался, полный разбор страницы: {err}")
+
         soup = BeautifulSoup(html_code, "html.parser")
         try:
             for _script in soup.select('script'):
@@ -264,24 +325,23 @@ class AvitoParse:
 
                 if data_type == 'mime' and script_type == 'mime/invalid':
                     script_content = html.unescape(_script.text)
-                    parsed_data = json.loads(script_content)
-
-                    if 'state' in parsed_data:
-                        return parsed_data['state']
-
-                    elif 'data' in parsed_data:
-                        logger.info("data")
-                        return parsed_data['data']
-
-                    else:
-                        return parsed_data
+                    return AvitoParse._unwrap_state(_json.loads(script_content))
 
         except Exception as err:
             logger.error(f"Ошибка при поиске информации на странице: {err}")
         return {}
 
-    def filter_ads(self, ads: list[Item]) -> list[Item]:
-        """Сортирует объявления"""
+    def filter_ads(
+            self, ads: list[Item], config: AvitoConfig | None = None, skip_viewed: bool = False
+    ) -> list[Item]:
+        """Сортирует объявления.
+
+        config — конфиг фильтров вызывающего (монитор передаёт конфиг задачи);
+        self.config при этом не меняется, вызов безопасен для общего парсера.
+        skip_viewed — не проверять viewed по одному объявлению: монитор делает
+        это сам одним запросом (SQLiteDBHandler.filter_new).
+        """
+        config = config or self.config
         ads = self._parse_area_from_description(ads)
         filters = [
             self._filter_viewed,
@@ -295,48 +355,55 @@ class AvitoParse:
             self._filter_by_promotion,
         ]
 
+        if skip_viewed:
+            filters.remove(self._filter_viewed)
+
         for filter_fn in filters:
-            ads = filter_fn(ads)
+            ads = filter_fn(ads, config)
             logger.info(f"После фильтрации {filter_fn.__name__} осталось {len(ads)}")
             if not len(ads):
                 return ads
         return ads
 
-    def _filter_by_price_range(self, ads: list[Item]) -> list[Item]:
+    def _filter_by_price_range(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
+        config = config or self.config
         try:
-            return [ad for ad in ads if self.config.min_price <= ad.priceDetailed.value <= self.config.max_price]
+            return [ad for ad in ads if config.min_price <= ad.priceDetailed.value <= config.max_price]
         except Exception as err:
             logger.debug(f"Ошибка при фильтрации по цене: {err}")
             return ads
 
-    def _filter_by_black_keywords(self, ads: list[Item]) -> list[Item]:
-        if not self.config.keys_word_black_list:
+    def _filter_by_black_keywords(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
+        config = config or self.config
+        if not config.keys_word_black_list:
             return ads
         try:
-            return [ad for ad in ads if not self._is_phrase_in_ads(ad=ad, phrases=self.config.keys_word_black_list)]
+            return [ad for ad in ads if not self._is_phrase_in_ads(ad=ad, phrases=config.keys_word_black_list)]
         except Exception as err:
             logger.debug(f"Ошибка при проверке объявлений по списку стоп-слов: {err}")
             return ads
 
-    def _filter_by_white_keyword(self, ads: list[Item]) -> list[Item]:
-        if not self.config.keys_word_white_list:
+    def _filter_by_white_keyword(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
+        config = config or self.config
+        if not config.keys_word_white_list:
             return ads
         try:
-            return [ad for ad in ads if self._is_phrase_in_ads(ad=ad, phrases=self.config.keys_word_white_list)]
+            return [ad for ad in ads if self._is_phrase_in_ads(ad=ad, phrases=config.keys_word_white_list)]
         except Exception as err:
             logger.debug(f"Ошибка при проверке объявлений по списку обязательных слов: {err}")
             return ads
 
-    def _filter_by_address(self, ads: list[Item]) -> list[Item]:
-        if not self.config.geo:
+    def _filter_by_address(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
+        config = config or self.config
+        if not config.geo:
             return ads
         try:
-            return [ad for ad in ads if self.config.geo in ad.geo.formattedAddress]
+            return [ad for ad in ads if config.geo in ad.geo.formattedAddress]
         except Exception as err:
             logger.debug(f"Ошибка при проверке объявлений по адресу: {err}")
             return ads
 
-    def _filter_viewed(self, ads: list[Item]) -> list[Item]:
+    def _filter_viewed(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
         try:
             return [ad for ad in ads if not self.is_viewed(ad=ad)]
         except Exception as err:
@@ -344,10 +411,15 @@ class AvitoParse:
             return ads
 
     def _add_seller_to_ads(self, ads: list[Item]) -> list[Item]:
+        return list(self.add_seller_iter(ads))
+
+    @staticmethod
+    def add_seller_iter(ads: Iterable[Item]) -> Iterator[Item]:
+        """Потоковый вариант _add_seller_to_ads: проставляет sellerId без промежуточного списка"""
         for ad in ads:
-            if seller_id := self._extract_seller_slug(data=ad):
+            if seller_id := AvitoParse._extract_seller_slug(data=ad):
                 ad.sellerId = seller_id
-        return ads
+            yield ad
 
     @staticmethod
     def _add_promotion_to_ads(ads: list[Item]) -> list[Item]:
@@ -359,27 +431,30 @@ class AvitoParse:
             )
         return ads
 
-    def _filter_by_seller(self, ads: list[Item]) -> list[Item]:
-        if not self.config.seller_black_list:
+    def _filter_by_seller(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
+        config = config or self.config
+        if not config.seller_black_list:
             return ads
         try:
-            return [ad for ad in ads if not ad.sellerId or ad.sellerId not in self.config.seller_black_list]
+            return [ad for ad in ads if not ad.sellerId or ad.sellerId not in config.seller_black_list]
         except Exception as err:
             logger.debug(f"Ошибка при отсеивании объявления с продавцами из черного списка : {err}")
             return ads
 
-    def _filter_by_recent_time(self, ads: list[Item]) -> list[Item]:
-        if not self.config.max_age:
+    def _filter_by_recent_time(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
+        config = config or self.config
+        if not config.max_age:
             return ads
         try:
             return [ad for ad in ads if
-                    self._is_recent(timestamp_ms=ad.sortTimeStamp, max_age_seconds=self.config.max_age)]
+                    self._is_recent(timestamp_ms=ad.sortTimeStamp, max_age_seconds=config.max_age)]
         except Exception as err:
             logger.debug(f"Ошибка при отсеивании слишком старых объявлений: {err}")
             return ads
 
-    def _filter_by_reserve(self, ads: list[Item]) -> list[Item]:
-        if not self.config.ignore_reserv:
+    def _filter_by_reserve(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
+        config = config or self.config
+        if not config.ignore_reserv:
             return ads
         try:
             return [ad for ad in ads if not ad.isReserved]
@@ -387,9 +462,10 @@ class AvitoParse:
             logger.debug(f"Ошибка при отсеивании объявлений в резерве: {err}")
             return ads
 
-    def _filter_by_promotion(self, ads: list[Item]) -> list[Item]:
+    def _filter_by_promotion(self, ads: list[Item], config: AvitoConfig | None = None) -> list[Item]:
+        config = config or self.config
         ads = self._add_promotion_to_ads(ads=ads)
-        if not self.config.ignore_promotion:
+        if not config.ignore_promotion:
             return ads
         try:
             return [ad for ad in ads if not ad.isPromotion]
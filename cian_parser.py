@@ -517,14 +517,20 @@ class CianParser:
             logger.error(f"Ошибка парсинга площади из карточки: {e}")
             return -1.0
 
-    def filter_ads(self, ads: list[CianItem]) -> list[CianItem]:
-        """Фильтрация объявлений"""
+    def filter_ads(self, ads: list[CianItem], skip_viewed: bool = False) -> list[CianItem]:
+        """Фильтрация объявлений
+
+        skip_viewed — без поштучной проверки viewed (монитор проверяет пачкой через filter_new)
+        """
         filters = [
             self._filter_viewed,
             self._filter_by_price_range,
             self._filter_by_area,
         ]
 
+        if skip_viewed:
+            filters.remove(self._filter_viewed)
+
         for filter_fn in filters:
             ads = filter_fn(ads)
             logger.info(f"После фильтрации {filter_fn.__name__}: {len(ads)} объявлений")
@@ -655,6 +661,13 @@ class CianParser:
 
     def parse(self):
         """Главный метод парсинга"""
+        try:
+            self._parse_urls()
+        finally:
+            # XLSXHandler сохраняет книгу пачками — дописываем остаток
+            self.xlsx_handler.flush()
+
+    def _parse_urls(self):
         logger.info(f"Начинаем парсинг Циан для города: {self.config.location}")
 
         for url_index, url in enumerate(self.config.urls):
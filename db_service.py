@@ -1,8 +1,19 @@
 import sqlite3
+import threading
 import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterable, Optional
 
 from models import Item
 
+# Размер пачки для IN (...) — с запасом ниже SQLITE_MAX_VARIABLE_NUMBER
+SQLITE_IN_CHUNK = 500
+
+
+def avito_viewed_key(ad: Item) -> tuple:
+    """Ключ (id, price) объявления Avito в таблице viewed"""
+    return ad.id, ad.priceDetailed.value
+
 
 class SQLiteDBHandler:
     """Работа с БД sqlite"""
@@ -16,6 +27,9 @@ class SQLiteDBHandler:
     def __init__(self, db_name="database.db"):
         if not hasattr(self, "_initialized"):
             self.db_name = db_name
+            # Долгоживущее соединение для пакетных запросов мониторов (см. _shared_conn)
+            self._conn: Optional[sqlite3.Connection] = None
+            self._conn_lock = threading.Lock()
             self._create_table()
             self._initialized = True
 
@@ -64,6 +78,20 @@ class SQLiteDBHandler:
 
             conn.commit()
 
+    @contextmanager
+    def _shared_conn(self):
+        """Одно соединение на все add_viewed_bulk/records_exist вместо connect() на вызов.
+
+        Открывается при первом запросе, PRAGMA выполняются один раз;
+        обращения из разных потоков сериализует _conn_lock.
+        """
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_name, check_same_thread=False)
+                # synchronous — настройка соединения, не файла БД
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            yield self._conn
+
     def add_record(self, ad: Item, user_id: int = 0):
         """Добавляет новую запись в таблицу viewed."""
 
@@ -91,6 +119,28 @@ class SQLiteDBHandler:
             )
             conn.commit()
 
+    def add_viewed_bulk(self, keys_by_user: Dict[int, Iterable[tuple]]) -> int:
+        """Записывает готовые ключи (id, price) нескольких пользователей одной транзакцией.
+
+        Возвращает количество переданных в INSERT строк.
+        """
+        now = time.time()
+        records = [
+            (record_id, price, user_id, now)
+            for user_id, keys in keys_by_user.items()
+            for record_id, price in keys
+        ]
+        if not records:
+            return 0
+
+        # with conn: commit, при ошибке — rollback
+        with self._shared_conn() as conn, conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO viewed (id, price, user_id, created_at) VALUES (?, ?, ?, ?)",
+                records,
+            )
+        return len(records)
+
     def record_exists(self, record_id, price, user_id: int = 0):
         """Проверяет, существует ли запись с заданными id, price и user_id."""
         with sqlite3.connect(self.db_name) as conn:
@@ -101,6 +151,49 @@ class SQLiteDBHandler:
             )
             return cursor.fetchone() is not None
 
+    def records_exist(self, ids: Iterable[int], user_id: int = 0) -> set[tuple]:
+        """Пары (id, price) из viewed пользователя для переданных id.
+
+        Пакетный аналог record_exists: один SELECT ... IN (...) на каждые
+        SQLITE_IN_CHUNK id вместо запроса на каждое объявление.
+        """
+        ids = list(ids)
+        seen: set[Hashable] = set()
+        if not ids:
+            return seen
+
+        with self._shared_conn() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(ids), SQLITE_IN_CHUNK):
+                chunk = ids[start:start + SQLITE_IN_CHUNK]
+                cursor.execute(
+                    f"SELECT id, price FROM viewed WHERE user_id = ? AND id IN ({','.join('?' * len(chunk))})",
+                    (user_id, *chunk),
+                )
+                seen.update(cursor.fetchall())
+        return seen
+
+    def filter_new(
+        self,
+        items: Iterable,
+        user_id: int = 0,
+        key: Optional[Callable[..., Optional[tuple]]] = None,
+    ) -> list:
+        """Возвращает объявления, которых ещё нет в viewed для пользователя.
+
+        Один records_exist на пачку вместо record_exists на каждое объявление.
+        key(ad) -> (id, price); None означает «всегда новое» (не проверяется в БД).
+        По умолчанию ключ Avito: (ad.id, ad.priceDetailed.value).
+        """
+        key = key or avito_viewed_key
+        keyed = [(ad, key(ad)) for ad in items]
+        ids = list({k[0] for _, k in keyed if k is not None})
+        if not ids:
+            return [ad for ad, _ in keyed]
+
+        seen = self.records_exist(ids, user_id)
+        return [ad for ad, k in keyed if k is None or k not in seen]
+
     def cleanup_old_records(self, max_age_days: int = 7) -> int:
         """Удаляет записи старше max_age_days дней. Возвращает кол-во удалённых."""
         cutoff = time.time() - (max_age_days * 86400)
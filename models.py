@@ -1,4 +1,6 @@
-from pydantic import BaseModel, HttpUrl, RootModel
+from functools import cached_property
+
+from pydantic import BaseModel, HttpUrl, RootModel, TypeAdapter
 from typing import List, Optional, Dict, Any
 
 
@@ -40,6 +42,25 @@ class PriceDetailed(BaseModel):
 class Image(RootModel):
     root: Dict[str, HttpUrl]
 
+    @cached_property
+    def largest_url(self) -> str:
+        """URL варианта с наибольшим разрешением.
+
+        Учитываются только ключи формата "WxH" — Avito иногда добавляет
+        нестандартные ключи типа "catalog". Считается один раз на объект:
+        одно и то же изображение читают XLSX, Telegram и VK.
+        """
+        best_url, best_area = None, -1
+        for key, url in self.root.items():
+            width, sep, height = key.partition("x")
+            if sep and width.isdigit() and height.isdigit():
+                area = int(width) * int(height)
+                if area > best_area:
+                    best_url, best_area = url, area
+        if best_url is None:
+            best_url = next(iter(self.root.values()))
+        return str(best_url)
+
 
 class Geo(BaseModel):
     geoReferences: List[Any]
@@ -151,3 +172,8 @@ class Item(BaseModel):
 
 class ItemsResponse(BaseModel):
     items: List[Item]
+
+
+# Валидатор списка объявлений catalog["items"] напрямую — без обёртки ItemsResponse
+# и без построения схемы на каждый вызов
+ITEMS_ADAPTER = TypeAdapter(List[Item])
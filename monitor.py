@@ -3,16 +3,21 @@ Monitor - система мониторинга Avito/Cian вместо per-user
 
 Архитектура:
 - AvitoMonitor и CianMonitor работают как asyncio tasks
-- httpx.AsyncClient для HTTP запросов (без curl_cffi)
+- curl_cffi AsyncSession для HTTP запросов (Chrome TLS fingerprint)
 - Последовательный polling всех пользовательских URL
-- Задержка 5-15 сек между запросами = built-in rate limiting
+- Общий RequestLimiter на площадку = built-in rate limiting
 - Cookies через CookieManager (Playwright)
-- Фильтрация через Option B (shared parser instance, reconfig before each URL)
+- Фильтрация через общий parser, конфиг фильтров задачи передаётся аргументом
 """
 import asyncio
+import bisect
+import functools
+import hashlib
 import random
 import time
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 from curl_cffi import requests as cffi_requests
@@ -23,47 +28,93 @@ import httpx
 from cookie_manager import cookie_manager
 from avito_parser import AvitoParse
 from cian_parser import CianParser
-from state_manager import monitoring_state
-from db_service import SQLiteDBHandler
-from dto import AvitoConfig, CianConfig
-from models import Item
+from state_manager import UrlSnapshot, monitoring_state
+from db_service import SQLiteDBHandler, avito_viewed_key
+from dto import AvitoConfig, CianConfig, Proxy
+from load_config import load_avito_config, load_cian_config
+from models import ITEMS_ADAPTER, Item
 from cian_models import CianItem
 from proxy_manager import proxy_manager
+from notification_queue import notification_queue
 
 
-async def _send_block_notification(platform: str, active_count: int, cooldown: int, url_list: List[dict]):
-    """Одно уведомление администратору об IP-блокировке (не per-task, а глобальное)"""
-    # Берём конфиг из первой задачи с pause_chat_id
-    cfg = next(
-        (u["config"] for u in url_list if u.get("config", {}).get("tg_token") and u.get("config", {}).get("pause_chat_id")),
-        None
-    )
-    if not cfg:
-        logger.warning(f"{platform.upper()}: IP-блок, но нет конфига для уведомления")
-        return
+# Служебные Telegram-уведомления (IP-блок, пауза задачи): один keep-alive клиент
+# и одна фоновая задача отправки вместо нового AsyncClient на каждое сообщение.
+# Очередь ограничена — при лавине уведомлений лишние отбрасываются, а не копятся.
+TG_NOTIFY_QUEUE_SIZE = 100
+# Сколько сообщений отправляется одновременно (рассылка по нескольким chat_id
+# идёт параллельно, а не N×RTT); по числу keep-alive соединений клиента
+TG_NOTIFY_CONCURRENCY = 8
 
-    tg_token = cfg["tg_token"]
-    chat_id = cfg["pause_chat_id"]
-    cooldown_min = cooldown // 60
+_tg_client: Optional[httpx.AsyncClient] = None
+_tg_queue: Optional[asyncio.Queue] = None
+_tg_worker_task: Optional[asyncio.Task] = None
+_tg_inflight: set = set()
 
-    text = (
-        f"⛔ <b>IP-блокировка {platform.upper()}</b>\n\n"
-        f"Сервис получил 403/429 от площадки.\n"
-        f"Мониторинг приостановлен на <b>{cooldown_min} мин.</b>\n"
-        f"Активных задач: <b>{active_count}</b>\n\n"
-        f"<i>Возобновится автоматически после cooldown.</i>"
-    )
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
+def _enqueue_tg(url: str, payload: dict, label: str):
+    """Кладёт сообщение в очередь служебных уведомлений (не ждёт отправки)"""
+    global _tg_client, _tg_queue, _tg_worker_task
+
+    if _tg_queue is None:
+        _tg_queue = asyncio.Queue(TG_NOTIFY_QUEUE_SIZE)
+    if _tg_client is None:
+        _tg_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=TG_NOTIFY_CONCURRENCY),
+        )
+    if _tg_worker_task is None or _tg_worker_task.done():
+        _tg_worker_task = asyncio.create_task(_tg_worker())
+
+    try:
+        _tg_queue.put_nowait((url, payload, label))
+    except asyncio.QueueFull:
+        logger.warning(f"Очередь служебных уведомлений переполнена, пропуск: {label}")
+
+
+async def _tg_post(url: str, payload: dict, label: str, sem: asyncio.Semaphore):
+    """Отправка одного служебного уведомления; ошибка логируется отдельно для каждого chat_id"""
+    try:
+        response = await _tg_client.post(url, json=payload)
+        response.raise_for_status()
+        logger.info(f"{label}: отправлено")
+    except Exception as e:
+        logger.error(f"{label}: ошибка отправки: {e}")
+    finally:
+        sem.release()
+        _tg_queue.task_done()
+
+
+async def _tg_worker():
+    """Фоновая отправка служебных уведомлений из _tg_queue, до TG_NOTIFY_CONCURRENCY параллельно"""
+    sem = asyncio.Semaphore(TG_NOTIFY_CONCURRENCY)
+    while True:
+        url, payload, label = await _tg_queue.get()
+        await sem.acquire()
+        task = asyncio.create_task(_tg_post(url, payload, label, sem))
+        _tg_inflight.add(task)
+        task.add_done_callback(_tg_inflight.discard)
+
+
+async def close_tg_notifier():
+    """Остановка фоновой отправки и закрытие HTTP-клиента (при shutdown сервиса)"""
+    global _tg_client, _tg_worker_task
+
+    if _tg_worker_task is not None:
+        _tg_worker_task.cancel()
         try:
-            response = await client.post(
-                f"https://api.telegram.org/bot{tg_token}/sendMessage",
-                json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
-            )
-            response.raise_for_status()
-            logger.info(f"{platform.upper()}: уведомление об IP-блоке отправлено → chat_id={chat_id}")
-        except Exception as e:
-            logger.error(f"{platform.upper()}: ошибка отправки IP-блок уведомления: {e}")
+            await _tg_worker_task
+        except asyncio.CancelledError:
+            pass
+        _tg_worker_task = None
+
+    # Дожидаемся уже начатых отправок (ограничены таймаутом клиента)
+    if _tg_inflight:
+        await asyncio.gather(*_tg_inflight, return_exceptions=True)
+
+    if _tg_client is not None:
+        await _tg_client.aclose()
+        _tg_client = None
 
 
 async def _send_pause_notification(url_data: dict):
@@ -91,22 +142,252 @@ async def _send_pause_notification(url_data: dict):
         ]]
     }
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        for chat_id in chat_ids:
-            try:
-                response = await client.post(
-                    f"https://api.telegram.org/bot{tg_token}/sendMessage",
-                    json={
-                        "chat_id": chat_id,
-                        "text": text,
-                        "parse_mode": "HTML",
-                        "reply_markup": reply_markup,
-                    }
+    for chat_id in chat_ids:
+        _enqueue_tg(
+            f"https://api.telegram.org/bot{tg_token}/sendMessage",
+            {
+                "chat_id": chat_id,
+                "text": text,
+                "parse_mode": "HTML",
+                "reply_markup": reply_markup,
+            },
+            f"Уведомление о паузе {task_id} → chat_id={chat_id}",
+        )
+
+
+# Запросы к viewed (оба монитора: пакетная проверка filter_new и запись) идут через один
+# выделенный поток: не блокируют цикл событий, SQLite всё равно пишет последовательно,
+# а отдельный executor не делит пул to_thread с остальным кодом
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="viewed-db")
+
+
+async def _run_db(fn, *args):
+    """Вызов блокирующего метода SQLiteDBHandler в потоке _db_executor"""
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, fn, *args)
+
+
+# Ключи user_config, влияющие на фильтрацию (остальное — токены/чаты — не важно)
+AVITO_FILTER_KEYS = (
+    "min_price", "max_price", "keys_word_white_list", "keys_word_black_list",
+    "seller_black_list", "geo", "max_age", "ignore_reserv", "ignore_promotion",
+)
+CIAN_FILTER_KEYS = ("location", "deal_type", "min_price", "max_price", "min_area", "max_area")
+
+
+def _freeze_filter_config(user_config: dict, keys: tuple) -> tuple:
+    """Хэшируемый снимок фильтров пользователя (ключ для lru_cache)"""
+    return tuple(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key in keys
+        if (value := user_config.get(key)) is not None
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _build_avito_config(frozen_filters: tuple) -> AvitoConfig:
+    """Конфиг фильтров Avito; задачи с одинаковыми фильтрами делят один объект"""
+    f = {key: list(value) if isinstance(value, tuple) else value for key, value in frozen_filters}
+    return AvitoConfig(
+        urls=[],
+        min_price=f.get("min_price", 0),
+        max_price=f.get("max_price", 999_999_999),
+        keys_word_white_list=f.get("keys_word_white_list", []),
+        keys_word_black_list=f.get("keys_word_black_list", []),
+        seller_black_list=f.get("seller_black_list", []),
+        geo=f.get("geo"),
+        max_age=f.get("max_age", 24 * 60 * 60),
+        ignore_reserv=f.get("ignore_reserv", True),
+        ignore_promotion=f.get("ignore_promotion", False)
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _build_cian_parser(frozen_filters: tuple) -> CianParser:
+    """Парсер Cian с конфигом фильтров; задачи с одинаковыми фильтрами делят один парсер"""
+    f = dict(frozen_filters)
+    config = CianConfig(
+        urls=[],
+        location=f.get("location", "Москва"),
+        deal_type=f.get("deal_type", "rent_long"),
+        min_price=f.get("min_price", 0),
+        max_price=f.get("max_price", 999_999_999),
+        min_area=f.get("min_area", 0),
+        max_area=f.get("max_area", 999_999)
+    )
+    return CianParser(config=config)
+
+
+def _avito_stamp(ad: Item) -> Optional[int]:
+    return ad.sortTimeStamp
+
+
+def _cian_stamp(ad: CianItem) -> Optional[float]:
+    return ad.timestamp
+
+
+def _take_newer(items: list, stamp, threshold: float) -> list:
+    """Объявления со stamp(ad) > threshold (ad без метки времени отбрасываются).
+
+    Страницы выдачи обычно отсортированы от новых к старым — тогда отсекаем
+    хвост бинарным поиском. Если порядок нарушен (продвинутые объявления
+    вверху выдачи, пропуски метки) — обычный проход по списку.
+    """
+    stamps = [stamp(ad) or 0 for ad in items]
+    if all(a >= b for a, b in zip(stamps, stamps[1:])):
+        cutoff = bisect.bisect_left(stamps, -threshold, key=lambda t: -t)
+        return [ad for ad in items[:cutoff] if stamp(ad)]
+    return [ad for ad, t in zip(items, stamps) if t and t > threshold]
+
+
+@functools.lru_cache(maxsize=4096)
+def _ad_pk(ad_id: str) -> int:
+    """Целочисленный id объявления Cian для viewed.
+
+    Нечисловые id — 63-битный blake2b: в отличие от hash() стабилен между
+    перезапусками (PYTHONHASHSEED), иначе viewed «забывал» бы объявления.
+    """
+    if ad_id.isdigit():
+        return int(ad_id)
+    digest = hashlib.blake2b(ad_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+
+class BlockDetected(Exception):
+    """IP-блок площадки (302/403/429): отменяет оставшиеся запросы цикла"""
+
+    def __init__(self, platform: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"{platform}: блокировка {status_code}")
+        self.platform = platform
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах (форму с HTTP-датой площадки не используют — игнорируем)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+# Маркер «страница не изменилась» (304 Not Modified на условный запрос)
+NOT_MODIFIED = object()
+
+
+class RequestLimiter:
+    """Общий лимитер запросов к площадке для всех воркеров монитора.
+
+    Вместо паузы после каждого запроса в каждом воркере — общий бюджет:
+    в среднем num_workers запросов за pause_between_requests секунд.
+    Интервалы между слотами случайные (анти-бот), а ждать приходится только
+    когда бюджет исчерпан — медленный запрос «съедает» свою паузу.
+    """
+
+    JITTER_TABLE_SIZE = 256
+
+    def __init__(self, pause_range: tuple, num_workers: int):
+        self._min_delay, self._max_delay = pause_range
+        self._num_workers = max(num_workers, 1)
+        self._next_slot = 0.0
+        self._jitter: List[float] = []
+        self._jitter_idx = 0
+
+    def _refill_jitter(self):
+        """Пачка готовых интервалов; перегенерируется по исчерпании, чтобы паттерн не повторялся"""
+        lo = self._min_delay / self._num_workers
+        hi = self._max_delay / self._num_workers
+        self._jitter = [random.uniform(lo, hi) for _ in range(self.JITTER_TABLE_SIZE)]
+        self._jitter_idx = 0
+
+    def _interval(self) -> float:
+        if self._jitter_idx >= len(self._jitter):
+            self._refill_jitter()
+        interval = self._jitter[self._jitter_idx]
+        self._jitter_idx += 1
+        return interval
+
+    async def acquire(self) -> float:
+        """Занимает ближайший свободный слот, возвращает фактическое ожидание"""
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval()
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class CircuitBreaker:
+    """Предохранитель для получения cookies.
+
+    После trip_threshold неудач подряд (пустые cookies или исключение)
+    размыкается на reset_timeout секунд: вызовы сразу возвращают None, не трогая
+    браузер. По истечении таймаута — HALF_OPEN: пропускается одна пробная
+    попытка, успех замыкает цепь, неудача снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, trip_threshold: int = 5, reset_timeout: float = 60):
+        self.name = name
+        self.trip_threshold = trip_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def _allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            logger.info(f"{self.name}: предохранитель cookies — пробная попытка")
+        # HALF_OPEN: одна пробная попытка за раз
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def _on_success(self):
+        if self.state != self.CLOSED:
+            logger.success(f"{self.name}: cookies снова получены — предохранитель замкнут")
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def _on_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self._failures >= self.trip_threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    f"{self.name}: {self._failures} неудач получения cookies подряд — "
+                    f"запросы приостановлены на {self.reset_timeout}с"
                 )
-                response.raise_for_status()
-                logger.info(f"Уведомление о паузе отправлено: {task_id} → chat_id={chat_id}")
-            except Exception as e:
-                logger.error(f"Ошибка отправки уведомления о паузе {task_id}: {e}")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    async def call(self, fn, *args, **kwargs):
+        """Вызов fn через предохранитель; None — цепь разомкнута или fn вернула пустой результат"""
+        if not self._allow():
+            return None
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception:
+            self._on_failure()
+            raise
+        if result:
+            self._on_success()
+        else:
+            self._on_failure()
+        return result
 
 
 @dataclass
@@ -131,21 +412,50 @@ class BaseMonitor:
         self.running = False
         self.task: Optional[asyncio.Task] = None
 
-        # Воркеры (httpx.AsyncClient создаётся per-request — не нужны сессии)
+        # Параллельная обработка до num_workers URL; все запросы идут через одну
+        # curl_cffi AsyncSession (создаётся в start, закрывается в stop)
         self.num_workers = num_workers
-        self._url_queue: Optional[asyncio.Queue] = None
-        self._worker_tasks: List[asyncio.Task] = []
+        self._session: Optional[cffi_requests.AsyncSession] = None
+
+        # id воркеров в proxy_manager (слоты jitter после ротации); под семафором
+        # одновременно заняты не более num_workers, поэтому очередь не пустеет
+        self._worker_ids = deque(proxy_manager.register_worker() for _ in range(num_workers))
+        self._limiter: Optional[RequestLimiter] = None
+
+        # Кэш неизменившихся страниц (ключ — task_id, т.к. один URL может
+        # мониториться разными пользователями): ETag/Last-Modified для
+        # условных запросов и blake2b тела последней успешно обработанной страницы
+        self._page_validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._page_digests: Dict[str, bytes] = {}
+        # Валидаторы последнего ответа до конца его обработки (см. _remember_page)
+        self._pending_validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
 
         # Тайминги (могут быть переопределены в подклассах из config)
         self.pause_between_requests = (5, 10)  # мин/макс секунд между URL
         self.pause_between_cycles = 30  # секунд между полными циклами
 
-        # Локальный флаг блокировки текущего цикла (403/429).
-        # Управление паузой и ротацией IP — в proxy_manager.
+        # Флаг блокировки текущего цикла (выставляется по BlockDetected, для метрик
+        # и выбора паузы). Управление паузой и ротацией IP — в proxy_manager.
         self._block_detected = False
 
-        # Очистка БД раз в сутки
-        self._last_cleanup = 0
+        # Ключи (id, price) новых объявлений цикла, ожидающие записи в viewed:
+        # user_id -> {key}. Пишутся одной транзакцией в конце цикла (_flush_records);
+        # set заодно не даёт одному объявлению из двух URL пользователя уйти дважды
+        self._pending_keys: Dict[int, set] = {}
+
+        # Предохранитель cookies: при сбое браузера/прокси не дёргаем его на каждый URL
+        self._cookie_breaker = CircuitBreaker(platform)
+
+        # Снимок активных URL площадки; перечитывается из monitoring_state
+        # только при смене monitoring_state.urls_version
+        self._cached_urls: List[UrlSnapshot] = []
+        self._cached_version: Optional[int] = None
+
+        # Очистка БД раз в сутки (по монотонным часам event loop)
+        self._last_cleanup: Optional[float] = None
+
+        # Ошибки цикла подряд — для экспоненциальной паузы перед повтором
+        self._cycle_err_streak = 0
 
         # Метрики
         self.total_cycles = 0
@@ -173,6 +483,10 @@ class BaseMonitor:
             cookie_manager._proxy = proxy
         await cookie_manager.acquire()
 
+        # Одна сессия на весь срок работы монитора: libcurl переиспользует
+        # TLS-соединения и DNS между воркерами и циклами
+        self._get_session()
+
         # Создание asyncio task
         self.task = asyncio.create_task(self._monitor_loop())
         logger.success(f"{self.platform} Monitor запущен")
@@ -192,31 +506,34 @@ class BaseMonitor:
             except asyncio.CancelledError:
                 pass
 
+        # Закрытие HTTP-сессии (пул соединений libcurl)
+        if self._session is not None:
+            try:
+                await self._session.close()
+            except Exception as e:
+                logger.warning(f"{self.platform}: ошибка закрытия HTTP-сессии: {e}")
+            self._session = None
+
         # Освобождение браузера
         await cookie_manager.release()
 
         logger.success(f"{self.platform} Monitor остановлен")
 
     async def _monitor_loop(self):
-        """Основной цикл: раздаёт URL воркерам через очередь"""
+        """Основной цикл: раз в цикл раздаёт URL через gather, параллелизм — Semaphore"""
         logger.info(f"{self.platform} Monitor: основной цикл запущен")
 
-        self._url_queue = asyncio.Queue()
-
-        # Запуск воркеров
-        self._worker_tasks = []
-        for i in range(self.num_workers):
-            task = asyncio.create_task(self._worker(i))
-            self._worker_tasks.append(task)
-        logger.info(f"{self.platform} Monitor: запущено {self.num_workers} воркеров")
+        # Лимитер создаётся здесь: тайминги подклассы задают после BaseMonitor.__init__
+        self._limiter = RequestLimiter(self.pause_between_requests, self.num_workers)
+        loop = asyncio.get_running_loop()
 
         try:
             while self.running:
                 try:
-                    cycle_start = time.time()
+                    cycle_start = loop.time()
 
-                    # Получение списка активных URL
-                    monitored_urls = monitoring_state.get_urls_for_platform(self.platform)
+                    # Получение списка активных URL (копия — только если набор изменился)
+                    monitored_urls = self._active_urls()
 
                     if not monitored_urls:
                         logger.debug(f"{self.platform}: нет активных URL, ожидание...")
@@ -231,17 +548,32 @@ class BaseMonitor:
                     # Сброс флага блокировки перед циклом
                     self._block_detected = False
 
-                    # Раздаём URL воркерам через очередь
-                    for url_data in monitored_urls:
-                        if self._block_detected or not self.running:
-                            break
-                        await self._url_queue.put(url_data)
-
-                    # Ждём пока все URL обработаны
-                    await self._url_queue.join()
+                    self._prune_page_cache({u.task_id for u in monitored_urls})
+
+                    # Не более num_workers URL одновременно. BlockDetected из любого
+                    # запроса отменяет все оставшиеся задачи цикла (structured cancellation)
+                    sem = asyncio.Semaphore(self.num_workers)
+                    retry_after = None
+                    try:
+                        async with asyncio.TaskGroup() as tg:
+                            for url_data in monitored_urls:
+                                tg.create_task(self._run(url_data, sem))
+                    except* BlockDetected as eg:
+                        self._block_detected = True
+                        retry_after = max(
+                            (e.retry_after for e in eg.exceptions if e.retry_after),
+                            default=None,
+                        )
+                        logger.warning(
+                            f"{self.platform} Monitor: {eg.exceptions[0]} — "
+                            f"оставшиеся запросы цикла отменены"
+                        )
+                    finally:
+                        # Уведомления уже в очереди — фиксируем viewed даже при блоке/остановке
+                        await self._flush_records()
 
                     # Статистика цикла
-                    cycle_time = time.time() - cycle_start
+                    cycle_time = loop.time() - cycle_start
                     self.last_cycle_time = cycle_time
                     self.total_cycles += 1
 
@@ -251,18 +583,22 @@ class BaseMonitor:
                     )
 
                     # Очистка БД раз в сутки (записи старше 7 дней)
-                    if time.time() - self._last_cleanup > 86400:
-                        deleted = self.db_handler.cleanup_old_records(max_age_days=7)
+                    if self._last_cleanup is None or loop.time() - self._last_cleanup > 86400:
+                        deleted = await _run_db(self.db_handler.cleanup_old_records, 7)
                         if deleted:
                             logger.info(f"{self.platform}: очистка БД — удалено {deleted} старых записей")
-                        self._last_cleanup = time.time()
+                        self._last_cleanup = loop.time()
+
+                    self._cycle_err_streak = 0
 
                     # Пауза между циклами
                     if self._block_detected:
                         # Делегируем ротацию IP и управление паузой в proxy_manager.
-                        # handle_block() заблокирует ВСЕ воркеры обоих мониторов
+                        # handle_block() заблокирует ВСЕ запросы обоих мониторов
                         # до завершения ротации + cooldown.
-                        await proxy_manager.handle_block(self.platform, monitored_urls)
+                        await proxy_manager.handle_block(
+                            self.platform, monitored_urls, retry_after=retry_after
+                        )
                     else:
                         logger.info(
                             f"{self.platform} Monitor: пауза {self.pause_between_cycles}с до следующего цикла"
@@ -272,106 +608,230 @@ class BaseMonitor:
                 except asyncio.CancelledError:
                     raise
                 except Exception as e:
-                    logger.error(f"{self.platform} Monitor: ошибка в цикле: {e}")
-                    await asyncio.sleep(30)
+                    # Экспоненциальная пауза: 2, 4, 8 ... до 30с; сбрасывается успешным циклом
+                    self._cycle_err_streak += 1
+                    backoff = min(30, 2 ** self._cycle_err_streak)
+                    logger.error(
+                        f"{self.platform} Monitor: ошибка в цикле: {e} "
+                        f"(подряд: {self._cycle_err_streak}, повтор через {backoff}с)"
+                    )
+                    await asyncio.sleep(backoff)
 
         except asyncio.CancelledError:
             logger.info(f"{self.platform} Monitor: получен сигнал остановки")
         finally:
-            # Остановка воркеров
-            for t in self._worker_tasks:
-                t.cancel()
-            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
             logger.info(f"{self.platform} Monitor: основной цикл завершён")
 
-    async def _worker(self, worker_id: int):
-        """Воркер: берёт URL из очереди, обрабатывает, ждёт паузу"""
-        logger.debug(f"{self.platform} Worker-{worker_id}: запущен")
-
-        try:
-            while True:
-                url_data = await self._url_queue.get()
-                try:
-                    if not self.running:
-                        continue
+    def _active_urls(self) -> List[UrlSnapshot]:
+        """Активные URL площадки из кэша; снимок обновляется при смене версии реестра"""
+        version = monitoring_state.urls_version
+        if version != self._cached_version:
+            self._cached_urls = monitoring_state.get_urls_for_platform(self.platform)
+            self._cached_version = version
+        return self._cached_urls
 
-                    if self._block_detected:
-                        # Собственный монитор обнаружил блок — дренируем очередь быстро,
-                        # не делая HTTP-запросов. Ротация запустится в _monitor_loop.
-                        continue
+    async def _run(self, url_data: UrlSnapshot, sem: asyncio.Semaphore):
+        """Обработка одного URL цикла под семафором и общим rate limit.
 
-                    # Ждём, если другой монитор уже запустил ротацию/cooldown.
-                    # Также возвращает False при FAILED — пропускаем запрос.
-                    if not await proxy_manager.wait_if_not_ready():
-                        continue
+        BlockDetected пробрасывается наружу — TaskGroup отменит остальные URL.
+        """
+        async with sem:
+            if not self.running:
+                return
 
-                    await self._process_url(url_data)
+            worker_id = self._worker_ids.popleft()
+            try:
+                # Ждём, если другой монитор уже запустил ротацию/cooldown.
+                # Также возвращает False при FAILED — пропускаем запрос.
+                if not await proxy_manager.wait_if_not_ready(worker_id):
+                    return
 
-                    # Пауза между запросами (rate limiting)
-                    min_delay, max_delay = self.pause_between_requests
-                    delay = random.uniform(min_delay, max_delay)
-                    logger.debug(f"{self.platform} W-{worker_id}: пауза {delay:.1f}с")
-                    await asyncio.sleep(delay)
+                # Общий rate limit площадки: спим только при исчерпании бюджета
+                delay = await self._limiter.acquire()
+                if delay:
+                    logger.debug("{}: пауза {:.1f}с перед {}", self.platform, delay, url_data.task_id)
 
-                except Exception as e:
-                    logger.error(
-                        f"{self.platform} W-{worker_id}: ошибка {url_data['url']}: {e}"
-                    )
-                    paused_snapshot = monitoring_state.increment_error(
-                        url_data['task_id'], error_msg=str(e)
-                    )
-                    if paused_snapshot:
-                        asyncio.create_task(_send_pause_notification(paused_snapshot))
-                    self.total_errors += 1
-                finally:
-                    self._url_queue.task_done()
+                await self._process_url(url_data)
 
-        except asyncio.CancelledError:
-            logger.debug(f"{self.platform} Worker-{worker_id}: остановлен")
+            except BlockDetected:
+                raise
+            except Exception as e:
+                logger.error(
+                    f"{self.platform}: ошибка {url_data.url}: {e}"
+                )
+                paused_snapshot = monitoring_state.increment_error(
+                    url_data.task_id, error_msg=str(e)
+                )
+                if paused_snapshot:
+                    await _send_pause_notification(paused_snapshot)
+                self.total_errors += 1
+            finally:
+                self._worker_ids.append(worker_id)
 
-    async def _process_url(self, url_data: dict):
+    async def _process_url(self, url_data: UrlSnapshot):
         """Обработка одного URL (переопределяется в подклассах)"""
         raise NotImplementedError
 
+    async def _fetch_cookies(self) -> Optional[Tuple[dict, str]]:
+        """cookies и User-Agent из cookie_manager; None — если cookies пустые"""
+        cookies, user_agent = await cookie_manager.get_cookies(self.platform, proxy=self.proxy)
+        return (cookies, user_agent) if cookies else None
+
+    async def _get_cookies(self) -> Optional[Tuple[dict, str]]:
+        """cookies через предохранитель: при разомкнутой цепи — сразу None"""
+        return await self._cookie_breaker.call(self._fetch_cookies)
+
+    @staticmethod
+    def _viewed_key(ad) -> Optional[tuple]:
+        """Ключ (id, price) объявления для таблицы viewed (переопределяется в подклассах)"""
+        raise NotImplementedError
+
+    async def _send_notifications(self, items: list, user_config: dict):
+        """Phase 3: Отправка уведомлений через notification queue.
+
+        Вся пачка ставится в очередь одним синхронным enqueue_many.
+        """
+        try:
+            notification_queue.enqueue_many(items, user_config, self.platform)
+        except Exception as e:
+            logger.error(f"{self.platform}: ошибка добавления в очередь: {e}")
+
+    def _defer_save(self, items: list, user_id: int) -> list:
+        """Откладывает запись объявлений в viewed до конца цикла.
+
+        Возвращает items без тех, что уже отложены в этом цикле для того же
+        пользователя (одно объявление может прийти с двух его URL).
+        """
+        keys = self._pending_keys.setdefault(user_id, set())
+        fresh = []
+        for ad in items:
+            key = self._viewed_key(ad)
+            if key is not None:
+                if key in keys:
+                    continue
+                keys.add(key)
+            fresh.append(ad)
+
+        return fresh
+
+    async def _flush_records(self):
+        """Запись отложенных за цикл объявлений одной транзакцией"""
+        if not self._pending_keys:
+            return
+
+        pending, self._pending_keys = self._pending_keys, {}
+        await self._save_to_db(pending)
+
+    async def _save_to_db(self, keys_by_user: Dict[int, set]):
+        """Сохранение в БД (per-user) в потоке — commit/fsync не блокирует event loop.
+
+        shield: при остановке монитора запись всё равно доводится до конца.
+        """
+        try:
+            saved = await asyncio.shield(_run_db(self.db_handler.add_viewed_bulk, keys_by_user))
+            logger.debug("{}: сохранено {} в БД", self.platform, saved)
+        except Exception as e:
+            logger.error(f"{self.platform}: ошибка сохранения в БД: {e}")
+
     def _build_proxy_url(self) -> Optional[str]:
         """Формирует URL прокси для httpx"""
-        proxy_split = proxy_manager._parse_proxy()
-        if not proxy_split:
-            return None
-        proto, host_port = proxy_split.ip_port.split("://", 1)
-        return f"{proto}://{proxy_split.login}:{proxy_split.password}@{host_port}"
+        resolved = proxy_manager._parse_proxy()
+        return resolved.url if resolved else None
+
+    def _is_page_unchanged(self, task_id: str, body: bytes) -> Tuple[bool, bytes]:
+        """Сравнивает хэш тела с последней успешно обработанной страницей задачи"""
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        return self._page_digests.get(task_id) == digest, digest
 
-    async def _fetch_html(self, url: str, cookies: dict, proxy_url: str = None) -> Optional[str]:
-        """Загрузка HTML через curl_cffi (Chrome TLS fingerprint)"""
+    def _remember_page(self, task_id: str, digest: bytes):
+        """Запоминает обработанную страницу: хэш тела и ETag/Last-Modified её ответа.
+
+        Валидаторы попадают в кэш только здесь: сохранённые до обработки, они дали бы
+        304 на следующий запрос, и страница с необработанными объявлениями пропустилась бы.
+        """
+        self._page_digests[task_id] = digest
+        validators = self._pending_validators.pop(task_id, None)
+        if validators:
+            self._page_validators[task_id] = validators
+
+    def _forget_page(self, task_id: str):
+        """Сбрасывает кэш страницы (после ошибки обработки страница должна быть разобрана заново)"""
+        self._page_validators.pop(task_id, None)
+        self._page_digests.pop(task_id, None)
+        self._pending_validators.pop(task_id, None)
+
+    def _prune_page_cache(self, active_task_ids: set):
+        """Удаляет из кэша страниц задачи, которые больше не мониторятся"""
+        for cache in (self._page_validators, self._page_digests, self._pending_validators):
+            for task_id in cache.keys() - active_task_ids:
+                del cache[task_id]
+
+    def _get_session(self) -> cffi_requests.AsyncSession:
+        """Общая AsyncSession монитора (libcurl multi-handle, без пула потоков)"""
+        if self._session is None:
+            self._session = cffi_requests.AsyncSession(max_clients=self.num_workers * 2)
+        return self._session
+
+    async def _fetch_html(self, url: str, cookies: dict, proxy_url: str = None, cache_key: str = None):
+        """Загрузка HTML через curl_cffi AsyncSession (Chrome TLS fingerprint).
+
+        Возвращает сырое тело ответа (bytes) — без декодирования в str,
+        JSON со страницы Avito парсится orjson напрямую. Если передан
+        cache_key и сервер ответил 304 на условный запрос — NOT_MODIFIED.
+        """
+        headers = None
+        if cache_key and cache_key in self._page_validators:
+            etag, last_modified = self._page_validators[cache_key]
+            headers = {}
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        proxy_dict = {"http": proxy_url, "https": proxy_url} if proxy_url else None
         try:
-            proxy_dict = {"http": proxy_url, "https": proxy_url} if proxy_url else None
-            response = await asyncio.to_thread(
-                self._fetch_html_sync, url, cookies, proxy_dict
-            )
-            return response
+            # stream: статус и заголовки известны до загрузки тела — страницу-заглушку
+            # блока (100+ КБ через прокси) не скачиваем
+            async with self._get_session().stream(
+                "GET",
+                url,
+                cookies=cookies,
+                headers=headers,
+                proxies=proxy_dict,
+                impersonate="chrome",
+                timeout=20,
+                allow_redirects=False,
+            ) as response:
+                status = response.status_code
+                if status in (302, 403, 429):
+                    raise BlockDetected(
+                        self.platform, status,
+                        retry_after=_parse_retry_after(response.headers.get("Retry-After")),
+                    )
+                # Ответ без блокировки: в HALF_OPEN замыкает цепь proxy_manager
+                proxy_manager.record_success()
+                if status == 304:
+                    return NOT_MODIFIED
+                if status != 200:
+                    logger.warning(f"{self.platform}: HTTP {status}")
+                    return None
+
+                body = await response.acontent()
+        except BlockDetected:
+            raise
         except Exception as e:
             logger.error(f"{self.platform}: fetch error: {e}")
             return None
 
-    def _fetch_html_sync(self, url: str, cookies: dict, proxy_dict: dict = None) -> Optional[str]:
-        session = cffi_requests.Session()
-        response = session.get(
-            url=url,
-            cookies=cookies,
-            proxies=proxy_dict,
-            impersonate="chrome",
-            timeout=20,
-            allow_redirects=False,
-        )
-        if response.status_code == 200:
-            return response.text
-        elif response.status_code in (302, 403, 429):
-            logger.warning(f"{self.platform}: блокировка {response.status_code}")
-            self._block_detected = True
-            return None
-        else:
-            logger.warning(f"{self.platform}: HTTP {response.status_code}")
-            return None
+        if cache_key:
+            # В _page_validators переносятся после обработки страницы (_remember_page)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self._pending_validators[cache_key] = (etag, last_modified)
+            else:
+                self._pending_validators.pop(cache_key, None)
+        return body
 
     def get_metrics(self) -> dict:
         """Получение метрик мониторинга"""
@@ -383,7 +843,7 @@ class BaseMonitor:
             "total_requests": self.total_requests,
             "total_errors": self.total_errors,
             "last_cycle_time": self.last_cycle_time,
-            "active_urls": len(monitoring_state.get_urls_for_platform(self.platform)),
+            "active_urls": len(self._active_urls()),
             "block_detected": self._block_detected,
             "proxy": proxy_manager.get_status(),
         }
@@ -396,7 +856,6 @@ class AvitoMonitor(BaseMonitor):
         super().__init__("avito", num_workers=1)
 
         # Загрузка базового конфига (для прокси и технических настроек)
-        from load_config import load_avito_config
         try:
             base_config = load_avito_config("config.toml")
             logger.debug(f"Avito Monitor: загружен config с прокси: {base_config.proxy_string[:20]}..." if base_config.proxy_string else "без прокси")
@@ -405,7 +864,6 @@ class AvitoMonitor(BaseMonitor):
             base_config = AvitoConfig(urls=[])
 
         # Сохраняем прокси для передачи в CookieManager
-        from dto import Proxy
         if base_config.proxy_string and base_config.proxy_change_url:
             self.proxy = Proxy(
                 proxy_string=base_config.proxy_string,
@@ -416,8 +874,12 @@ class AvitoMonitor(BaseMonitor):
             self.proxy = None
             logger.info("Avito Monitor: работаем без прокси")
 
-        # Передаём прокси в ProxyManager (оба монитора используют один и тот же прокси)
-        proxy_manager.configure(self.proxy)
+        # Передаём прокси в ProxyManager (оба монитора используют один и тот же прокси).
+        # Чат администратора из config.toml, если задан; иначе — из конфига задач
+        notify_cfg = None
+        if base_config.tg_token and base_config.tg_chat_id:
+            notify_cfg = {"tg_token": base_config.tg_token, "pause_chat_id": base_config.tg_chat_id[0]}
+        proxy_manager.configure(self.proxy, notify_cfg=notify_cfg)
 
         # Тайминги из config.toml (5-10с между запросами, 30с между циклами)
         self.pause_between_requests = (
@@ -430,154 +892,137 @@ class AvitoMonitor(BaseMonitor):
             f"между циклами {self.pause_between_cycles}с"
         )
 
-        # Option B: один экземпляр парсера, будем менять config перед каждым URL
+        # Один экземпляр парсера на монитор; конфиг фильтров задачи передаётся в filter_ads
         self.parser = AvitoParse(config=base_config)
 
     async def start(self):
         """Запуск мониторинга (переопределяем чтобы передать прокси)"""
         await super().start(proxy=self.proxy)
 
-    async def _process_url(self, url_data: dict):
+    async def _process_url(self, url_data: UrlSnapshot):
         """Обработка одного Avito URL"""
-        url = url_data['url']
-        user_id = url_data['user_id']
-        task_id = url_data['task_id']
-        user_config = url_data['config']
-        logger.debug(f"Avito: обработка {url} (user={user_id})")
+        url = url_data.url
+        user_id = url_data.user_id
+        task_id = url_data.task_id
+        user_config = url_data.config
+        logger.debug("Avito: обработка {} (user={})", url, user_id)
 
         try:
-            # 1. Получение cookies (Playwright)
-            cookies, _ = await cookie_manager.get_cookies("avito", proxy=self.proxy)
+            # 1. Получение cookies (Playwright) через предохранитель
+            got = await self._get_cookies()
 
-            if not cookies:
-                logger.warning("Avito: cookies не получены — пропуск без ошибки")
+            if not got:
+                logger.debug("Avito: cookies не получены — пропуск без ошибки ({})", url)
                 return
+            cookies, _ = got
 
-            # 2. Fetch HTML через httpx
-            html = await self._fetch_html(url, cookies, self._build_proxy_url())
+            # 2. Fetch HTML через curl_cffi
+            html = await self._fetch_html(url, cookies, self._build_proxy_url(), cache_key=task_id)
+
+            if html is NOT_MODIFIED:
+                logger.debug("Avito: страница не изменилась (304) — {}", url)
+                self.total_requests += 1
+                monitoring_state.record_check(task_id)
+                return
 
             if not html:
-                if not self._block_detected:
-                    logger.warning(f"Avito: не удалось получить HTML для {url}")
-                    monitoring_state.increment_error(task_id, "fetch_html_failed")
-                # IP-блок (302/403/429) — обрабатывается глобально в _monitor_loop
+                # IP-блок (302/403/429) сюда не доходит — BlockDetected обрабатывается в _monitor_loop
+                logger.warning(f"Avito: не удалось получить HTML для {url}")
+                monitoring_state.increment_error(task_id, "fetch_html_failed")
                 return
 
             self.total_requests += 1
 
+            unchanged, page_digest = self._is_page_unchanged(task_id, html)
+            if unchanged:
+                logger.debug("Avito: страница не изменилась с прошлого цикла — {}", url)
+                self._remember_page(task_id, page_digest)
+                monitoring_state.record_check(task_id)
+                return
+
             # 3. Парсинг JSON из HTML (@staticmethod, без экземпляра)
             data = AvitoParse.find_json_on_page(html)
             catalog = data.get("data", {}).get("catalog") or {}
 
             if not catalog.get("items"):
-                logger.debug(f"Avito: нет объявлений на {url}")
+                logger.debug("Avito: нет объявлений на {}", url)
                 monitoring_state.record_check(task_id)
                 return
 
             # Парсинг items
-            from models import ItemsResponse
             try:
-                ads_models = ItemsResponse(**catalog)
-                items = ads_models.items
+                # model_construct() не подходит: вложенные модели (priceDetailed, geo,
+                # images) остались бы сырыми dict. Валидируем только список items
+                # готовым TypeAdapter, остальной catalog не трогаем.
+                items = ITEMS_ADAPTER.validate_python(catalog["items"])
             except Exception as e:
                 logger.error(f"Avito: ошибка валидации: {e}")
                 return
 
-            # Очистка null items
-            items = [ad for ad in items if ad.id]
-
-            # Добавление seller
-            items = self.parser._add_seller_to_ads(items)
+            # Очистка null items + добавление seller одним проходом. Дальше этапы
+            # работают со списками: filter_ads логирует len после каждого фильтра и
+            # возвращает вход при ошибке, _take_newer режет хвост бинарным поиском,
+            # filter_new собирает все id до запроса в БД
+            items = list(AvitoParse.add_seller_iter(ad for ad in items if ad.id))
 
             logger.info(f"Avito: найдено {len(items)} объявлений на {url}")
 
-            # 4. Фильтрация (Option B: переконфигурируем parser)
-            filtered_items = await self._filter_items(items, user_config)
+            # 4. Фильтрация конфигом задачи
+            filtered_items = await self._filter_items(items, task_id, user_config)
 
             logger.info(f"Avito: после фильтрации осталось {len(filtered_items)} объявлений")
 
-            # 5. Фильтр по времени старта мониторинга (только новые объявления)
-            started_at = url_data.get('started_at', 0)
+            # 5. Фильтр по времени старта мониторинга
+            started_at = url_data.started_at
             if started_at and filtered_items:
                 # Debug: показать значения sortTimeStamp для диагностики
                 sample = filtered_items[0]
                 logger.debug(
-                    f"Avito: started_at={started_at:.0f}, "
-                    f"sample sortTimeStamp={sample.sortTimeStamp}, "
-                    f"sample id={sample.id}"
+                    "Avito: started_at={:.0f}, sample sortTimeStamp={}, sample id={}",
+                    started_at, sample.sortTimeStamp, sample.id
                 )
                 before_count = len(filtered_items)
                 started_at_ms = started_at * 1000  # sortTimeStamp в миллисекундах
-                filtered_items = [
-                    ad for ad in filtered_items
-                    if ad.sortTimeStamp and ad.sortTimeStamp > started_at_ms
-                ]
+                filtered_items = _take_newer(filtered_items, _avito_stamp, started_at_ms)
                 skipped = before_count - len(filtered_items)
                 if skipped:
-                    logger.debug(f"Avito: отфильтровано {skipped} старых объявлений (до старта мониторинга)")
+                    logger.debug("Avito: отфильтровано {} старых объявлений (до старта мониторинга)", skipped)
 
             # 6. Проверка против БД (per-user: каждый пользователь получает уведомление)
-            new_items = [ad for ad in filtered_items if not self._is_viewed(ad, user_id)]
+            new_items = await _run_db(self.db_handler.filter_new, filtered_items, user_id, self._viewed_key)
 
             logger.info(f"Avito: новых объявлений: {len(new_items)} (user={user_id})")
 
-            # 7. Отправка уведомлений
-            if new_items:
-                await self._send_notifications(new_items, user_config)
+            # 7. Сохранение в БД (per-user) — откладывается до конца цикла
+            new_items = self._defer_save(new_items, user_id)
 
-            # 8. Сохранение в БД (per-user)
+            # 8. Отправка уведомлений
             if new_items:
-                self.db_handler.add_record_from_page(new_items, user_id=user_id)
+                await self._send_notifications(new_items, user_config)
 
             # Запись результата проверки при успехе
             monitoring_state.record_check(task_id, len(new_items))
+            self._remember_page(task_id, page_digest)
 
+        except BlockDetected:
+            raise
         except Exception as e:
+            self._forget_page(task_id)
             logger.error(f"Avito: ошибка обработки {url}: {e}")
             monitoring_state.increment_error(task_id, str(e))
             raise
 
-    async def _filter_items(self, items: List[Item], user_config: dict) -> List[Item]:
-        """Фильтрация объявлений (Option B: переконфигурируем parser)"""
-        # Создаём временный config из user_config
-        from dto import AvitoConfig
-
-        config = AvitoConfig(
-            urls=[],
-            min_price=user_config.get("min_price", 0),
-            max_price=user_config.get("max_price", 999_999_999),
-            keys_word_white_list=user_config.get("keys_word_white_list", []),
-            keys_word_black_list=user_config.get("keys_word_black_list", []),
-            seller_black_list=user_config.get("seller_black_list", []),
-            geo=user_config.get("geo"),
-            max_age=user_config.get("max_age", 24 * 60 * 60),
-            ignore_reserv=user_config.get("ignore_reserv", True),
-            ignore_promotion=user_config.get("ignore_promotion", False)
+    async def _filter_items(self, items: List[Item], task_id: str, user_config: dict) -> List[Item]:
+        """Фильтрация объявлений конфигом задачи (общий parser не переконфигурируется)"""
+        config = monitoring_state.register_url_processor(
+            task_id,
+            lambda: _build_avito_config(_freeze_filter_config(user_config, AVITO_FILTER_KEYS))
         )
+        # viewed проверяется пачкой в filter_new — поштучный _filter_viewed не нужен
+        return self.parser.filter_ads(items, config=config, skip_viewed=True)
 
-        # Переконфигурируем существующий parser (Option B)
-        self.parser.config = config
-
-        # Вызываем filter_ads
-        return self.parser.filter_ads(items)
-
-    def _is_viewed(self, ad: Item, user_id: int) -> bool:
-        """Проверка просмотрено ли объявление для конкретного пользователя"""
-        return self.db_handler.record_exists(ad.id, ad.priceDetailed.value, user_id=user_id)
-
-    async def _send_notifications(self, items: List[Item], user_config: dict):
-        """Phase 3: Отправка уведомлений через notification queue"""
-        from notification_queue import notification_queue
-
-        for ad in items:
-            try:
-                await notification_queue.enqueue_ad(
-                    ad=ad,
-                    user_config=user_config,
-                    platform="avito"
-                )
-            except Exception as e:
-                logger.error(f"Avito: ошибка добавления в очередь: {e}")
+    # Ключ (id, price) для таблицы viewed — тот же, что у SQLiteDBHandler по умолчанию
+    _viewed_key = staticmethod(avito_viewed_key)
 
 
 class CianMonitor(BaseMonitor):
@@ -587,7 +1032,6 @@ class CianMonitor(BaseMonitor):
         super().__init__("cian")
 
         # Загрузка базового конфига (для прокси и технических настроек)
-        from load_config import load_cian_config
         try:
             base_config = load_cian_config("config.toml")
             logger.debug(f"Cian Monitor: загружен config с прокси: {base_config.proxy_string[:20]}..." if base_config.proxy_string else "без прокси")
@@ -596,7 +1040,6 @@ class CianMonitor(BaseMonitor):
             base_config = CianConfig(urls=[], location="Москва")
 
         # Сохраняем прокси для передачи в CookieManager
-        from dto import Proxy
         if base_config.proxy_string and base_config.proxy_change_url:
             self.proxy = Proxy(
                 proxy_string=base_config.proxy_string,
@@ -629,38 +1072,55 @@ class CianMonitor(BaseMonitor):
         """Запуск мониторинга (переопределяем чтобы передать прокси)"""
         await super().start(proxy=self.proxy)
 
-    async def _process_url(self, url_data: dict):
+    async def _parse_list_page(self, html: bytes) -> List[CianItem]:
+        """Разбор страницы выдачи в потоке — BeautifulSoup не блокирует event loop"""
+        return await asyncio.to_thread(self.parser.parse_list_page, html.decode("utf-8", errors="replace"))
+
+    async def _process_url(self, url_data: UrlSnapshot):
         """Обработка одного Cian URL"""
-        url = url_data['url']
-        user_id = url_data['user_id']
-        task_id = url_data['task_id']
-        user_config = url_data['config']
+        url = url_data.url
+        user_id = url_data.user_id
+        task_id = url_data.task_id
+        user_config = url_data.config
 
-        logger.debug(f"Cian: обработка {url} (user={user_id})")
+        logger.debug("Cian: обработка {} (user={})", url, user_id)
 
         try:
-            # 1. Получение cookies (Playwright)
-            cookies, _ = await cookie_manager.get_cookies("cian", proxy=self.proxy)
+            # 1. Получение cookies (Playwright) через предохранитель
+            got = await self._get_cookies()
 
-            if not cookies:
-                logger.warning(f"Cian: нет валидных cookies, пропускаю {url}")
+            if not got:
+                logger.debug("Cian: нет валидных cookies, пропускаю {}", url)
                 return
+            cookies, _ = got
 
-            # 2. Fetch HTML через httpx
-            html = await self._fetch_html(url, cookies, self._build_proxy_url())
+            # 2. Fetch HTML через curl_cffi
+            html = await self._fetch_html(url, cookies, self._build_proxy_url(), cache_key=task_id)
+
+            if html is NOT_MODIFIED:
+                logger.debug("Cian: страница не изменилась (304) — {}", url)
+                self.total_requests += 1
+                monitoring_state.record_check(task_id)
+                return
 
             if not html:
-                if not self._block_detected:
-                    # Реальная ошибка конкретной задачи (5xx, timeout) — считаем per-task
-                    logger.warning(f"Cian: не удалось получить HTML для {url}")
-                    monitoring_state.increment_error(task_id, "fetch_html_failed")
-                # IP-блок (403/429) — обрабатывается глобально в _monitor_loop, не per-task
+                # Реальная ошибка конкретной задачи (5xx, timeout) — считаем per-task.
+                # IP-блок (403/429) сюда не доходит — BlockDetected обрабатывается в _monitor_loop
+                logger.warning(f"Cian: не удалось получить HTML для {url}")
+                monitoring_state.increment_error(task_id, "fetch_html_failed")
                 return
 
             self.total_requests += 1
 
+            unchanged, page_digest = self._is_page_unchanged(task_id, html)
+            if unchanged:
+                logger.debug("Cian: страница не изменилась с прошлого цикла — {}", url)
+                self._remember_page(task_id, page_digest)
+                monitoring_state.record_check(task_id)
+                return
+
             # 3. Парсинг списка объявлений
-            items = self.parser.parse_list_page(html)
+            items = await self._parse_list_page(html)
 
             logger.info(f"Cian: найдено {len(items)} объявлений на {url}")
 
@@ -669,108 +1129,61 @@ class CianMonitor(BaseMonitor):
                 return
 
             # 4. Фильтрация
-            filtered_items = await self._filter_items(items, user_config)
+            filtered_items = await self._filter_items(items, task_id, user_config)
 
             logger.info(f"Cian: после фильтрации осталось {len(filtered_items)} объявлений")
 
             # 5. Фильтр по времени старта мониторинга
-            started_at = url_data.get('started_at', 0)
+            started_at = url_data.started_at
             if started_at:
                 before_count = len(filtered_items)
-                filtered_items = [
-                    ad for ad in filtered_items
-                    if ad.timestamp and ad.timestamp > started_at
-                ]
+                filtered_items = _take_newer(filtered_items, _cian_stamp, started_at)
                 skipped = before_count - len(filtered_items)
                 if skipped:
-                    logger.debug(f"Cian: отфильтровано {skipped} старых объявлений (до старта мониторинга)")
+                    logger.debug("Cian: отфильтровано {} старых объявлений (до старта мониторинга)", skipped)
 
             # 6. Проверка против БД (per-user)
-            new_items = [ad for ad in filtered_items if not self._is_viewed(ad, user_id)]
+            new_items = await _run_db(self.db_handler.filter_new, filtered_items, user_id, self._viewed_key)
 
             logger.info(f"Cian: новых объявлений: {len(new_items)} (user={user_id})")
 
-            # 7. Отправка уведомлений
-            if new_items:
-                await self._send_notifications(new_items, user_config)
+            # 7. Сохранение в БД (per-user) — откладывается до конца цикла
+            new_items = self._defer_save(new_items, user_id)
 
-            # 8. Сохранение в БД (per-user)
+            # 8. Отправка уведомлений
             if new_items:
-                self._save_to_db(new_items, user_id=user_id)
+                await self._send_notifications(new_items, user_config)
 
             # Запись результата проверки при успехе
             monitoring_state.record_check(task_id, len(new_items))
+            self._remember_page(task_id, page_digest)
 
+        except BlockDetected:
+            raise
         except Exception as e:
+            self._forget_page(task_id)
             logger.error(f"Cian: ошибка обработки {url}: {e}")
             monitoring_state.increment_error(task_id, str(e))
             raise
 
-    async def _filter_items(self, items: List[CianItem], user_config: dict) -> List[CianItem]:
+    async def _filter_items(self, items: List[CianItem], task_id: str, user_config: dict) -> List[CianItem]:
         """Фильтрация объявлений"""
-        from dto import CianConfig
-
-        config = CianConfig(
-            urls=[],
-            location=user_config.get("location", "Москва"),
-            deal_type=user_config.get("deal_type", "rent_long"),
-            min_price=user_config.get("min_price", 0),
-            max_price=user_config.get("max_price", 999_999_999),
-            min_area=user_config.get("min_area", 0),
-            max_area=user_config.get("max_area", 999_999)
+        # Парсер с конфигом задачи строится один раз на набор фильтров
+        parser = monitoring_state.register_url_processor(
+            task_id,
+            lambda: _build_cian_parser(_freeze_filter_config(user_config, CIAN_FILTER_KEYS))
         )
 
-        # Переконфигурируем parser
-        parser = CianParser(config=config)
-
         # Фильтрация
-        return parser.filter_ads(items)
+        return parser.filter_ads(items, skip_viewed=True)
 
-    def _is_viewed(self, ad: CianItem, user_id: int) -> bool:
-        """Проверка просмотрено ли объявление для конкретного пользователя"""
+    @staticmethod
+    def _viewed_key(ad: CianItem) -> Optional[tuple]:
+        """Ключ (id, price) для таблицы viewed; None — без цены, всегда считаем новым"""
         if not ad.price or ad.price.value <= 0:
-            return False
-
-        ad_id = int(ad.id) if ad.id.isdigit() else abs(hash(ad.id))
-        return self.db_handler.record_exists(ad_id, ad.price.value, user_id=user_id)
-
-    def _save_to_db(self, items: List[CianItem], user_id: int = 0):
-        """Сохранение в БД (per-user)"""
-        try:
-            import sqlite3
-            now = time.time()
-            records = []
-            for ad in items:
-                if ad.price and ad.price.value > 0:
-                    ad_id = int(ad.id) if ad.id.isdigit() else abs(hash(ad.id))
-                    records.append((ad_id, ad.price.value, user_id, now))
-
-            if records:
-                with sqlite3.connect(self.db_handler.db_name) as conn:
-                    cursor = conn.cursor()
-                    cursor.executemany(
-                        "INSERT OR IGNORE INTO viewed (id, price, user_id, created_at) VALUES (?, ?, ?, ?)",
-                        records
-                    )
-                    conn.commit()
-                logger.debug(f"Cian: сохранено {len(records)} в БД (user={user_id})")
-
-        except Exception as e:
-            logger.error(f"Cian: ошибка сохранения в БД: {e}")
-
-    async def _send_notifications(self, items: List[CianItem], user_config: dict):
-        """Phase 3: Отправка уведомлений через notification queue"""
-        from notification_queue import notification_queue
+            return None
 
-        for ad in items:
-            try:
-                await notification_queue.enqueue_ad(
-                    ad=ad,
-                    user_config=user_config,
-                    platform="cian"
-                )
-            except Exception as e:
-                logger.error(f"Cian: ошибка добавления в очередь: {e}")
+        return _ad_pk(ad.id), ad.price.value
 
 
 # Глобальные экземпляры мониторов
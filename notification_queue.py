@@ -1,33 +1,194 @@
 import asyncio
 import contextlib
+import functools
 import time
-from typing import Optional, Union, List, Iterable
-from dataclasses import dataclass, field
+from collections import deque
+from typing import Dict, Optional, Tuple, Union, List, Iterable
 from loguru import logger
-import requests as http_requests
+import httpx
 
 from models import Item
 from cian_models import CianItem
 from tg_sender import SendAdToTg
 
 
-TELEGRAM_RATE_LIMIT_INTERVAL = 0.035
+# Лимиты Telegram Bot API: ~30 сообщений/с на бота, ~1 сообщение/с в один чат
+TELEGRAM_BOT_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+# AIMD для лимита бота: +AIMD_STEP msg/s за успешную отправку (до TELEGRAM_BOT_RATE),
+# вдвое меньше при 429/5xx (не ниже AIMD_MIN_RATE)
+AIMD_STEP = 0.5
+AIMD_MIN_RATE = 1
 MAX_QUEUE_SIZE = 1000
 MAX_RETRIES = 3
 GRACEFUL_SHUTDOWN_TIMEOUT = 10
+HTTP_TIMEOUT = 10
+# Сколько элементов очереди забирается и обрабатывается за один проход consumer
+BATCH_MAX = 32
+# Объявления с фото одному получателю из одной пачки склеиваются в sendMediaGroup
+# (Telegram: от 2 до 10 элементов в альбоме)
+MEDIA_GROUP_MAX = 10
 
 PRIORITY_SYSTEM = 0
 PRIORITY_AD = 1
 
+# Реакция на статус ответа Telegram: один dict lookup вместо цепочки сравнений.
+# Статусы, которых нет в таблице (прочие 4xx, 5xx, сетевые), — повтор с backoff
+SEND_OK = "ok"
+SEND_FLOOD = "flood"
+SEND_GIVE_UP = "give_up"
+SEND_RETRY = "retry"
+
+_NO_RETRY_STATUSES = frozenset({400, 401, 403, 404})
+_STATUS_ACTION = {
+    200: SEND_OK,
+    429: SEND_FLOOD,
+    **dict.fromkeys(_NO_RETRY_STATUSES, SEND_GIVE_UP),
+}
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не более capacity подряд.
+
+    Скорость считается по часам event loop, а не суммой пауз: медленная
+    отправка не съедает бюджет, а накопленные токены позволяют короткий всплеск.
+    При min_rate < rate скорость адаптивная (AIMD): on_success поднимает её
+    на AIMD_STEP, on_throttle — делит пополам.
+    """
+
+    def __init__(self, rate: float, capacity: float, min_rate: Optional[float] = None):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = rate if min_rate is None else min_rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated: Optional[float] = None
+
+    def on_success(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + AIMD_STEP)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Сервер не справляется: скорость вдвое, при retry_after — пауза для всех ждущих"""
+        self.rate = max(self.min_rate, self.rate / 2)
+        if retry_after:
+            # Отрицательный запас токенов = ожидание retry_after до следующей отправки
+            self._tokens = min(self._tokens, 0.0) - retry_after * self.rate
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._updated is not None:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@functools.lru_cache(maxsize=256)
+def _bot_urls(bot_token: str) -> Tuple[str, str, str]:
+    """URL sendMessage, sendPhoto и sendMediaGroup бота (строятся один раз на токен)"""
+    base = f"https://api.telegram.org/bot{bot_token}"
+    return f"{base}/sendMessage", f"{base}/sendPhoto", f"{base}/sendMediaGroup"
+
+
+# Элемент очереди — кортеж (priority, data): без отдельного класса-обёртки
+NotificationItem = Tuple[int, dict]
+
+
+class TwoPriorityQueue:
+    """Очередь с двумя приоритетами (system, ad) на двух deque.
+
+    Интерфейс как у asyncio.Queue (get/get_nowait/put_nowait/task_done/join),
+    но push/pop за O(1) без кучи и сравнений элементов. При переполнении
+    вытесняется самое старое объявление — системные сообщения не теряются,
+    пока в очереди есть объявления.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._system: deque = deque()
+        self._ads: deque = deque()
+        self._not_empty = asyncio.Event()
+        self._all_done = asyncio.Event()
+        self._all_done.set()
+        self._unfinished = 0
+
+    def qsize(self) -> int:
+        return len(self._system) + len(self._ads)
+
+    def empty(self) -> bool:
+        return not (self._system or self._ads)
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self.qsize()
+
+    def put_nowait(self, item: NotificationItem) -> Optional[NotificationItem]:
+        """Добавляет элемент; возвращает вытесненный при переполнении (или None)"""
+        dropped = None
+        if self.full():
+            dropped = (self._ads or self._system).popleft()
+            self.task_done()
+
+        (self._system if item[0] == PRIORITY_SYSTEM else self._ads).append(item)
+        self._unfinished += 1
+        self._all_done.clear()
+        self._not_empty.set()
+        return dropped
+
+    def get_nowait(self) -> NotificationItem:
+        if self._system:
+            item = self._system.popleft()
+        elif self._ads:
+            item = self._ads.popleft()
+        else:
+            raise asyncio.QueueEmpty
+
+        if self.empty():
+            self._not_empty.clear()
+        return item
+
+    async def get(self) -> NotificationItem:
+        while self.empty():
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def task_done(self):
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._all_done.set()
 
-@dataclass(order=True)
-class NotificationItem:
-    priority: int
-    timestamp: float = field(compare=False)
-    data: dict = field(compare=False)
+    async def join(self):
+        if self._unfinished:
+            await self._all_done.wait()
+
+
+def _retry_after_header(response: httpx.Response) -> Optional[float]:
+    """Retry-After из заголовков ответа в секундах (None — нет или не число)"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0) or None
+    except ValueError:
+        return None
 
 
 class NotificationQueue:
+    """Очередь Telegram-уведомлений (singleton) с одним фоновым consumer.
+
+    Consumer — чистое планирование I/O (ожидание очереди, token bucket, HTTP),
+    поэтому его пропускная способность упирается в реализацию event loop:
+    сервис запускается на uvloop (см. api.py и Dockerfile).
+    """
+
     _instance: Optional["NotificationQueue"] = None
 
     def __new__(cls):
@@ -40,9 +201,15 @@ class NotificationQueue:
         if self._initialized:
             return
 
-        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue(MAX_QUEUE_SIZE)
+        self.queue = TwoPriorityQueue(MAX_QUEUE_SIZE)
         self.running = False
         self._consumer_task: Optional[asyncio.Task] = None
+        # Один keep-alive клиент к api.telegram.org на всё время работы очереди
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Лимиты отправки: общий на бота (token) и отдельный на каждый чат
+        self._bot_limiters: Dict[str, TokenBucket] = {}
+        self._chat_limiters: Dict[Union[str, int], TokenBucket] = {}
 
         self.sent_count = 0
         self.failed_count = 0
@@ -59,6 +226,10 @@ class NotificationQueue:
 
         self.running = True
         self._start_time = time.time()
+        self._client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=75),
+        )
         self._consumer_task = asyncio.create_task(self._consumer_loop())
 
     async def stop(self):
@@ -77,12 +248,17 @@ class NotificationQueue:
             with contextlib.suppress(asyncio.CancelledError):
                 await self._consumer_task
 
-    async def enqueue_ad(
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def enqueue_ad(
         self,
         ad: Union[Item, CianItem],
         user_config: dict,
         platform: str,
-    ):
+    ) -> None:
+        """Синхронная постановка объявления в очередь"""
         tg_token = user_config.get("tg_token")
         tg_chat_id = user_config.get("tg_chat_id")
 
@@ -99,14 +275,41 @@ class NotificationQueue:
             "platform": platform,
         }
 
-        await self._put_to_queue(PRIORITY_AD, data)
+        self._put_nowait(PRIORITY_AD, data)
 
-    async def enqueue_system_message(
+    def enqueue_many(
+        self,
+        ads: Iterable[Union[Item, CianItem]],
+        user_config: dict,
+        platform: str,
+    ) -> None:
+        """Постановка в очередь пачки объявлений за один вызов.
+
+        chat_ids нормализуются один раз на всю пачку, вставка синхронная.
+        """
+        tg_token = user_config.get("tg_token")
+        tg_chat_id = user_config.get("tg_chat_id")
+
+        if not tg_token or not tg_chat_id:
+            return
+
+        chat_ids = self._normalize_chat_ids(tg_chat_id)
+
+        for ad in ads:
+            self._put_nowait(PRIORITY_AD, {
+                "type": "ad",
+                "ad": ad,
+                "bot_token": tg_token,
+                "chat_ids": chat_ids,
+                "platform": platform,
+            })
+
+    def enqueue_system_message(
         self,
         msg: str,
         bot_token: str,
         chat_ids: Union[str, int, Iterable[Union[str, int]]],
-    ):
+    ) -> None:
         chat_ids = self._normalize_chat_ids(chat_ids)
 
         data = {
@@ -116,33 +319,22 @@ class NotificationQueue:
             "chat_ids": chat_ids,
         }
 
-        await self._put_to_queue(PRIORITY_SYSTEM, data)
+        self._put_nowait(PRIORITY_SYSTEM, data)
 
     def _normalize_chat_ids(
         self, chat_ids: Union[str, int, Iterable[Union[str, int]]]
-    ) -> List[Union[str, int]]:
+    ) -> Tuple[Union[str, int], ...]:
+        """chat_ids как неизменяемый кортеж: общий для всех объявлений пачки"""
         if isinstance(chat_ids, (str, int)):
-            return [chat_ids]
+            return (chat_ids,)
 
         if isinstance(chat_ids, Iterable):
-            return list(chat_ids)
+            return tuple(chat_ids)
 
-        return []
-
-    async def _put_to_queue(self, priority: int, data: dict):
-        item = NotificationItem(priority, time.time(), data)
-
-        if self.queue.full():
-            try:
-                self.queue.get_nowait()
-                self.queue.task_done()
-                self.dropped_count += 1
-            except asyncio.QueueEmpty:
-                pass
+        return ()
 
-        try:
-            self.queue.put_nowait(item)
-        except asyncio.QueueFull:
+    def _put_nowait(self, priority: int, data: dict):
+        if self.queue.put_nowait((priority, data)) is not None:
             self.dropped_count += 1
 
     async def _consumer_loop(self):
@@ -152,55 +344,173 @@ class NotificationQueue:
             except asyncio.TimeoutError:
                 continue
 
+            # Всё, что уже накопилось, забираем без ожидания и обрабатываем
+            # пачкой; темп отправки по-прежнему задают token bucket-ы
+            batch = [item]
+            while len(batch) < BATCH_MAX:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
             try:
-                await self._process_item(item)
+                await self._process_batch([data for _, data in batch])
             finally:
-                self.queue.task_done()
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _process_batch(self, batch: List[dict]):
+        """Обработка пачки: объявления одним получателям группируются для альбомов"""
+        singles = []
+        ads_by_target: Dict[tuple, List[dict]] = {}
+        for data in batch:
+            if data.get("type") == "ad" and data.get("bot_token") and data.get("chat_ids"):
+                target = (data["bot_token"], data["chat_ids"])
+                ads_by_target.setdefault(target, []).append(data)
+            else:
+                singles.append(data)
 
-    async def _process_item(self, item: NotificationItem):
-        data = item.data
+        jobs = [self._process_item(data) for data in singles]
+        for (bot_token, chat_ids), ads in ads_by_target.items():
+            if len(ads) < 2:
+                jobs.extend(self._process_item(data) for data in ads)
+                continue
+            for start in range(0, len(ads), MEDIA_GROUP_MAX):
+                jobs.append(self._process_media_group(
+                    bot_token, chat_ids, ads[start:start + MEDIA_GROUP_MAX]
+                ))
+
+        await asyncio.gather(*jobs)
+
+    async def _process_item(self, data: dict):
         bot_token = data.get("bot_token")
-        chat_ids = data.get("chat_ids", [])
+        chat_ids = data.get("chat_ids", ())
 
         if not bot_token or not chat_ids:
             return
 
-        for chat_id in chat_ids:
-            success = await self._send_single(chat_id, data)
+        # Текст и картинка объявления форматируются один раз на элемент, а не на каждый чат
+        try:
+            request = self._build_request(bot_token, data)
+        except Exception as e:
+            logger.error(f"Ошибка форматирования сообщения TG: {e}")
+            self.failed_count += len(chat_ids)
+            return
+
+        await self._fanout(bot_token, chat_ids, request)
 
-            if success:
-                self.sent_count += 1
-            else:
-                self.failed_count += 1
+    async def _process_media_group(self, bot_token: str, chat_ids: tuple, ads: List[dict]):
+        """До MEDIA_GROUP_MAX объявлений с фото — одним sendMediaGroup на чат.
+
+        Объявления без фото (и альбом из одного фото) уходят обычными сообщениями.
+        """
+        photos = []
+        rest = []
+        for data in ads:
+            try:
+                request = self._build_request(bot_token, data)
+            except Exception as e:
+                logger.error(f"Ошибка форматирования сообщения TG: {e}")
+                self.failed_count += len(chat_ids)
+                continue
+            (photos if "photo" in request[1] else rest).append(request)
+
+        if len(photos) < 2:
+            rest.extend(photos)
+            photos = []
+
+        jobs = [self._fanout(bot_token, chat_ids, request) for request in rest]
+        if photos:
+            media = [
+                {
+                    "type": "photo",
+                    "media": template["photo"],
+                    "caption": template["caption"],
+                    "parse_mode": template["parse_mode"],
+                }
+                for _, template in photos
+            ]
+            album = (_bot_urls(bot_token)[2], {"media": media})
+            jobs.append(self._fanout(bot_token, chat_ids, album, weight=len(media)))
+        await asyncio.gather(*jobs)
+
+    async def _fanout(
+        self, bot_token: str, chat_ids: Iterable, request: Tuple[str, dict], weight: int = 1
+    ):
+        """Отправка одного запроса во все чаты; weight — сколько объявлений в запросе"""
+        results = await asyncio.gather(
+            *(self._send_single(chat_id, bot_token, request) for chat_id in chat_ids),
+            return_exceptions=True,
+        )
 
-            await asyncio.sleep(TELEGRAM_RATE_LIMIT_INTERVAL)
+        for result in results:
+            if result is True:
+                self.sent_count += weight
+            else:
+                if isinstance(result, Exception):
+                    logger.error(f"Ошибка отправки TG: {result}")
+                self.failed_count += weight
+
+    def _bot_limiter(self, bot_token: str) -> TokenBucket:
+        bot_limiter = self._bot_limiters.get(bot_token)
+        if bot_limiter is None:
+            bot_limiter = self._bot_limiters[bot_token] = TokenBucket(
+                TELEGRAM_BOT_RATE, TELEGRAM_BOT_RATE, min_rate=AIMD_MIN_RATE
+            )
+        return bot_limiter
+
+    async def _acquire_rate(self, bot_token: str, chat_id: Union[str, int]):
+        """Ждёт токены лимита чата и общего лимита бота"""
+        chat_limiter = self._chat_limiters.get(chat_id)
+        if chat_limiter is None:
+            chat_limiter = self._chat_limiters[chat_id] = TokenBucket(
+                TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_RATE
+            )
 
-    async def _send_single(self, chat_id: Union[str, int], data: dict) -> bool:
-        bot_token = data["bot_token"]
+        await chat_limiter.acquire()
+        await self._bot_limiter(bot_token).acquire()
 
+    async def _send_single(
+        self, chat_id: Union[str, int], bot_token: str, request: Tuple[str, dict]
+    ) -> bool:
         for attempt in range(MAX_RETRIES):
             try:
-                response = await asyncio.to_thread(
-                    self._do_send, chat_id, bot_token, data
-                )
-
-                if response.status_code == 200:
+                await self._acquire_rate(bot_token, chat_id)
+                response = await self._do_send(chat_id, request)
+                status = response.status_code
+                action = _STATUS_ACTION.get(status, SEND_RETRY)
+
+                # Retry-After может прийти и с успешным ответом — притормаживаем
+                # бота заранее, не дожидаясь 429
+                header_retry_after = _retry_after_header(response)
+
+                if action is SEND_OK:
+                    limiter = self._bot_limiter(bot_token)
+                    if header_retry_after:
+                        limiter.on_throttle(header_retry_after)
+                    else:
+                        limiter.on_success()
                     return True
 
-                if response.status_code == 429:
+                if action is SEND_FLOOD:
                     retry_after = (
                         response.json()
                         .get("parameters", {})
-                        .get("retry_after", 5)
+                        .get("retry_after", header_retry_after or 5)
                     )
                     self.retry_count += 1
-                    await asyncio.sleep(retry_after)
+                    # Пауза ложится на лимит бота — ждут все отправки этого бота,
+                    # а не только получившая 429
+                    self._bot_limiter(bot_token).on_throttle(retry_after)
                     continue
 
-                if response.status_code in (400, 401, 403, 404):
+                if action is SEND_GIVE_UP:
                     logger.error(response.text)
                     return False
 
+                if status >= 500:
+                    self._bot_limiter(bot_token).on_throttle()
+
                 wait_time = 2**attempt
                 self.retry_count += 1
                 await asyncio.sleep(wait_time)
@@ -211,49 +521,39 @@ class NotificationQueue:
 
         return False
 
-    def _do_send(
-        self, chat_id: Union[str, int], bot_token: str, data: dict
-    ) -> http_requests.Response:
-        msg_type = data.get("type")
+    @staticmethod
+    def _build_request(bot_token: str, data: dict) -> Tuple[str, dict]:
+        """URL метода и шаблон payload (без chat_id) для сообщения очереди"""
+        send_message_url, send_photo_url, _ = _bot_urls(bot_token)
 
-        if msg_type == "system":
-            payload = {
-                "chat_id": chat_id,
+        if data.get("type") == "system":
+            return send_message_url, {
                 "text": data["msg"],
                 "parse_mode": "MarkdownV2",
             }
-            return http_requests.post(
-                f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                json=payload,
-                timeout=10,
-            )
 
         ad = data["ad"]
         message = SendAdToTg.format_ad(ad)
         image_url = SendAdToTg.get_first_image(ad)
 
         if image_url:
-            payload = {
-                "chat_id": chat_id,
+            return send_photo_url, {
                 "caption": message,
                 "photo": image_url,
                 "parse_mode": "MarkdownV2",
                 "disable_web_page_preview": True,
             }
-            method = "sendPhoto"
-        else:
-            payload = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "MarkdownV2",
-            }
-            method = "sendMessage"
 
-        return http_requests.post(
-            f"https://api.telegram.org/bot{bot_token}/{method}",
-            json=payload,
-            timeout=10,
-        )
+        return send_message_url, {
+            "text": message,
+            "parse_mode": "MarkdownV2",
+        }
+
+    async def _do_send(
+        self, chat_id: Union[str, int], request: Tuple[str, dict]
+    ) -> httpx.Response:
+        url, template = request
+        return await self._client.post(url, json={"chat_id": chat_id, **template})
 
     def get_metrics(self) -> dict:
         uptime = time.time() - self._start_time if self._start_time else 0
@@ -2,12 +2,59 @@ import json
 import sqlite3
 import threading
 import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from itertools import groupby
 from datetime import datetime, timezone
-from typing import Dict, Optional, List
+from typing import Any, Callable, Dict, NamedTuple, Optional, List
 from loguru import logger
 from models_api import TaskStatus, TaskProgress, TaskResponse
 import uuid
 
+# Интервал сброса накопленных изменений в БД (сек) и максимум операций в одной транзакции
+FLUSH_INTERVAL = 0.5
+FLUSH_BATCH_SIZE = 500
+
+# Все запросы записи monitored_urls: одна строка на вид операции — писатель
+# компилирует каждую один раз и дальше берёт из кэша подготовленных запросов
+_SQL = {
+    "save": (
+        "INSERT OR REPLACE INTO monitored_urls "
+        "(task_id, url, platform, user_id, config, status, started_at, registered_at, linked_task_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    ),
+    "delete": "DELETE FROM monitored_urls WHERE task_id = ?",
+    "update_status": "UPDATE monitored_urls SET status = ? WHERE task_id = ?",
+    "update_check": "UPDATE monitored_urls SET last_check = ?, notifications_sent = ? WHERE task_id = ?",
+    "update_link": "UPDATE monitored_urls SET linked_task_id = ? WHERE task_id = ?",
+    "suspend_all": "UPDATE monitored_urls SET status = 'suspended' WHERE status IN ('active', 'paused')",
+}
+
+# Внутри менеджеров время хранится как unix timestamp (time.time()),
+# в datetime переводится только при выдаче наружу
+_TASK_TS_FIELDS = ("started_at", "updated_at", "completed_at")
+_URL_TS_FIELDS = ("registered_at", "last_check")
+
+# Пустой прогресс новой задачи — dump модели строится один раз, задачам отдаются копии
+_EMPTY_PROGRESS = TaskProgress().model_dump()
+_TASK_RESPONSE_FIELDS = tuple(TaskResponse.model_fields)
+
+
+class UrlSnapshot(NamedTuple):
+    """Неизменяемый снимок активного URL для мониторов — только поля, которые им нужны"""
+    task_id: str
+    url: str
+    platform: str
+    user_id: int
+    config: dict
+    status: str
+    started_at: float  # unix timestamp — фильтр объявлений по времени старта
+
+
+def _to_datetime(ts: Optional[float]) -> Optional[datetime]:
+    """unix timestamp → datetime UTC (None остаётся None)"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc) if ts is not None else None
+
 
 class TaskStateManager:
     """Управление состоянием задач парсинга (старый режим - для обратной совместимости)"""
@@ -18,16 +65,17 @@ class TaskStateManager:
 
     def create_task(self, user_id: int, **kwargs) -> str:
         """Создать новую задачу"""
-        task_id = str(uuid.uuid4())
+        task_id = uuid.uuid4().hex
+        now = time.time()
 
         with self._lock:
             self._tasks[task_id] = {
                 "task_id": task_id,
                 "user_id": user_id,
                 "status": TaskStatus.PENDING,
-                "progress": TaskProgress().model_dump(),
-                "started_at": datetime.now(timezone.utc),
-                "updated_at": datetime.now(timezone.utc),
+                "progress": _EMPTY_PROGRESS.copy(),
+                "started_at": now,
+                "updated_at": now,
                 "completed_at": None,
                 "error_message": None,
                 "results": None,
@@ -44,18 +92,22 @@ class TaskStateManager:
             if not task:
                 return None
 
-            # Убираем stop_event из ответа (не сериализуется)
-            task_copy = task.copy()
-            task_copy.pop("stop_event", None)
+            # Данные задачи формирует сам менеджер — повторная валидация pydantic
+            # не нужна, собираем ответ через model_construct. Берём только поля
+            # ответа (stop_event и прочие служебные ключи не попадают)
+            fields = {key: task.get(key) for key in _TASK_RESPONSE_FIELDS}
+            fields["progress"] = TaskProgress.model_construct(**task["progress"])
+            for key in _TASK_TS_FIELDS:
+                fields[key] = _to_datetime(fields[key])
 
-            return TaskResponse(**task_copy)
+        return TaskResponse.model_construct(**fields)
 
     def update_task(self, task_id: str, **updates):
         """Обновить состояние задачи"""
         with self._lock:
             if task_id in self._tasks:
                 self._tasks[task_id].update(updates)
-                self._tasks[task_id]["updated_at"] = datetime.now(timezone.utc)
+                self._tasks[task_id]["updated_at"] = time.time()
 
     def update_progress(
             self,
@@ -79,7 +131,7 @@ class TaskStateManager:
                 if source is not None:
                     progress["source"] = source
 
-                self._tasks[task_id]["updated_at"] = datetime.now(timezone.utc)
+                self._tasks[task_id]["updated_at"] = time.time()
 
     def set_running(self, task_id: str):
         """Установить статус 'выполняется'"""
@@ -90,7 +142,7 @@ class TaskStateManager:
         self.update_task(
             task_id,
             status=TaskStatus.COMPLETED,
-            completed_at=datetime.now(timezone.utc),
+            completed_at=time.time(),
             results=results or {}
         )
 
@@ -99,7 +151,7 @@ class TaskStateManager:
         self.update_task(
             task_id,
             status=TaskStatus.FAILED,
-            completed_at=datetime.now(timezone.utc),
+            completed_at=time.time(),
             error_message=error
         )
 
@@ -108,14 +160,14 @@ class TaskStateManager:
         self.update_task(
             task_id,
             status=TaskStatus.STOPPED,
-            completed_at=datetime.now(timezone.utc)
+            completed_at=time.time()
         )
 
     def get_stop_event(self, task_id: str) -> Optional[threading.Event]:
         """Получить stop_event для задачи"""
-        with self._lock:
-            task = self._tasks.get(task_id)
-            return task.get("stop_event") if task else None
+        # dict.get атомарен под GIL — lock для чтения одной ссылки не нужен
+        task = self._tasks.get(task_id)
+        return task.get("stop_event") if task else None
 
     def request_stop(self, task_id: str) -> bool:
         """Запросить остановку задачи"""
@@ -136,8 +188,34 @@ class MonitoringStateManager:
 
     def __init__(self, db_name: str = "database.db"):
         self._monitored_urls: Dict[str, dict] = {}  # task_id -> url_data
+        # Предвычисленные мониторами спецификации обработки (фильтры и т.п.) — task_id -> spec
+        self._url_processors: Dict[str, Any] = {}
+        # _lock — только структура реестра, версия и метрики (короткие секции).
+        # Поля одной записи меняются под её собственным lock из _url_locks,
+        # чтобы record_check/increment_error разных URL не ждали друг друга
         self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        # Индекс (platform, status) -> {task_id}: выборки по платформе/статусу
+        # пропорциональны результату, а не размеру реестра. Меняется под _lock
+        self._by_platform_status: Dict[tuple, set] = defaultdict(set)
+        # Версия набора активных URL: растёт при любом изменении состава/статусов.
+        # Мониторы держат свой снимок и перечитывают его только при смене версии
+        self._urls_version = 0
         self._db_name = db_name
+        # Одно долгоживущее соединение на запись вместо connect() на каждое изменение.
+        # isolation_level=None — autocommit; доступ из потоков мониторов сериализует _db_lock
+        self._db_lock = threading.Lock()
+        self._write_conn = sqlite3.connect(
+            db_name, check_same_thread=False, isolation_level=None, cached_statements=256
+        )
+        self._configure_conn(self._write_conn)
+        # БД нужна только для восстановления после рестарта — живые чтения идут из памяти.
+        # Изменения копятся очередью (sql, params) и пишутся фоновым потоком пачками
+        # в одной транзакции раз в FLUSH_INTERVAL. Статистика проверок схлопывается
+        # по task_id (task_id -> (last_check, notifications_sent))
+        self._pending_ops: deque = deque()
+        self._pending_checks: Dict[str, tuple] = {}
+        self._pending_lock = threading.Lock()
 
         # Метрики
         self._metrics = {
@@ -151,10 +229,33 @@ class MonitoringStateManager:
         self._init_db()
         self._restore_from_db()
 
+        # Флашер спит до FLUSH_INTERVAL, но его можно разбудить раньше: при переполнении
+        # очереди (_flush_wakeup) и при остановке (_flush_stop + _flush_wakeup)
+        self._flush_wakeup = threading.Event()
+        self._flush_stop = threading.Event()
+        self._flush_thread = threading.Thread(
+            target=self._flush_loop, name="state-flusher", daemon=True
+        )
+        self._flush_thread.start()
+
+    @staticmethod
+    def _configure_conn(conn: sqlite3.Connection):
+        """
+        Настройка соединения: WAL, synchronous=NORMAL (безопасно при WAL),
+        ожидание блокировки вместо мгновенного 'database is locked'
+        """
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA wal_autocheckpoint=1000")
+        conn.execute("PRAGMA journal_size_limit=67108864")
+
     def _init_db(self):
         """Создание таблицы monitored_urls если не существует"""
-        with sqlite3.connect(self._db_name) as conn:
-            conn.execute("PRAGMA journal_mode=WAL")
+        with self._db_lock:
+            conn = self._write_conn
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS monitored_urls (
@@ -175,18 +276,15 @@ class MonitoringStateManager:
                     conn.execute(f"ALTER TABLE monitored_urls ADD COLUMN {col_def}")
                 except sqlite3.OperationalError:
                     pass  # Колонка уже существует
-            conn.commit()
 
     def _restore_from_db(self):
-        """Восстановление активных URL из БД после рестарта"""
-        with sqlite3.connect(self._db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+        """Восстановление активных URL из БД после рестарта (единственное чтение из БД)"""
+        with self._db_lock:
+            rows = self._write_conn.execute(
                 "SELECT task_id, url, platform, user_id, config, status, started_at, registered_at, "
                 "last_check, notifications_sent, linked_task_id "
                 "FROM monitored_urls WHERE status IN ('active', 'suspended')"
-            )
-            rows = cursor.fetchall()
+            ).fetchall()
 
         if not rows:
             return
@@ -209,80 +307,109 @@ class MonitoringStateManager:
                 "config": config,
                 "error_count": 0,
                 "status": "active",
-                "registered_at": datetime.fromtimestamp(registered_at, tz=timezone.utc),
+                "registered_at": registered_at,
                 "started_at": started_at,
-                "last_check": datetime.fromtimestamp(last_check_ts, tz=timezone.utc) if last_check_ts else None,
+                "last_check": last_check_ts,
                 "last_error": None,
                 "notifications_sent": notifications_sent or 0,
                 "linked_task_id": linked_task_id,
+                "_config_json": config_json,
             }
+            self._url_locks[task_id] = threading.Lock()
+            self._by_platform_status[(platform, "active")].add(task_id)
 
         # Переводим 'suspended' → 'active' в БД (только graceful-shutdown задачи, не error-paused)
-        with sqlite3.connect(self._db_name) as conn:
-            conn.execute("UPDATE monitored_urls SET status = 'active' WHERE status = 'suspended'")
-            conn.commit()
+        with self._db_lock:
+            self._write_conn.execute("UPDATE monitored_urls SET status = 'active' WHERE status = 'suspended'")
 
         self._metrics["total_registered"] = len(self._monitored_urls)
         logger.info(f"Восстановлено {len(self._monitored_urls)} URL из БД (suspended → active)")
 
+    def _enqueue(self, sql: str, params: tuple):
+        """Поставить запись в очередь; набралась пачка — будим флашер, не дожидаясь интервала"""
+        self._pending_ops.append((sql, params))
+        if len(self._pending_ops) >= FLUSH_BATCH_SIZE:
+            self._flush_wakeup.set()
+
     def _db_save(self, url_data: dict):
         """Сохранение URL в БД"""
-        try:
-            with sqlite3.connect(self._db_name) as conn:
-                conn.execute(
-                    """
-                    INSERT OR REPLACE INTO monitored_urls
-                    (task_id, url, platform, user_id, config, status, started_at, registered_at, linked_task_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        url_data["task_id"],
-                        url_data["url"],
-                        url_data["platform"],
-                        url_data["user_id"],
-                        json.dumps(url_data["config"], ensure_ascii=False),
-                        url_data["status"],
-                        url_data["started_at"],
-                        url_data["registered_at"].timestamp(),
-                        url_data.get("linked_task_id"),
-                    )
-                )
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Ошибка сохранения в БД: {e}")
+        self._enqueue(
+            _SQL["save"],
+            (
+                url_data["task_id"],
+                url_data["url"],
+                url_data["platform"],
+                url_data["user_id"],
+                url_data["_config_json"],
+                url_data["status"],
+                url_data["started_at"],
+                url_data["registered_at"],
+                url_data.get("linked_task_id"),
+            )
+        )
 
     def _db_delete(self, task_id: str):
         """Удаление URL из БД"""
-        try:
-            with sqlite3.connect(self._db_name) as conn:
-                conn.execute("DELETE FROM monitored_urls WHERE task_id = ?", (task_id,))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Ошибка удаления из БД: {e}")
-
-    def _db_update_check_stats(self, task_id: str, last_check_ts: float, notifications_sent: int):
-        """Обновление статистики проверки в БД"""
-        try:
-            with sqlite3.connect(self._db_name) as conn:
-                conn.execute(
-                    "UPDATE monitored_urls SET last_check = ?, notifications_sent = ? WHERE task_id = ?",
-                    (last_check_ts, notifications_sent, task_id)
-                )
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Ошибка обновления статистики в БД: {e}")
+        self._enqueue(_SQL["delete"], (task_id,))
 
     def _db_update_status(self, task_id: str, status: str):
         """Обновление статуса в БД"""
+        self._enqueue(_SQL["update_status"], (status, task_id))
+
+    def _flush_loop(self):
+        """Фоновый сброс накопленных изменений"""
+        while not self._flush_stop.is_set():
+            self._flush_wakeup.wait(FLUSH_INTERVAL)
+            self._flush_wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Записать накопленные изменения в БД
+
+        Операции пишутся в порядке поступления, пачками по FLUSH_BATCH_SIZE —
+        каждая пачка одной транзакцией (один fsync), подряд идущие операции
+        одного вида — одним executemany. Статистика проверок идёт последней.
+        """
+        # _db_lock держим и на выборку из очереди: иначе два flush() могли бы
+        # закоммитить пачки не в том порядке, в котором они пришли
+        with self._db_lock:
+            while True:
+                batch = []
+                while self._pending_ops and len(batch) < FLUSH_BATCH_SIZE:
+                    batch.append(self._pending_ops.popleft())
+                if not self._pending_ops:
+                    with self._pending_lock:
+                        checks, self._pending_checks = self._pending_checks, {}
+                    batch.extend(
+                        (_SQL["update_check"], (ts, sent, task_id))
+                        for task_id, (ts, sent) in checks.items()
+                    )
+                if not batch:
+                    return
+                self._write_batch(batch)
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция писателя (под _db_lock): COMMIT при успехе, ROLLBACK при ошибке"""
+        conn = self._write_conn
+        # BEGIN IMMEDIATE — блокировка записи берётся сразу, без SQLITE_BUSY при апгрейде
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            with sqlite3.connect(self._db_name) as conn:
-                conn.execute(
-                    "UPDATE monitored_urls SET status = ? WHERE task_id = ?",
-                    (status, task_id)
-                )
-                conn.commit()
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _write_batch(self, batch: List[tuple]):
+        """Пачка операций одной транзакцией (под _db_lock)"""
+        try:
+            with self._transaction() as conn:
+                for sql, group in groupby(batch, key=lambda op: op[0]):
+                    conn.executemany(sql, [params for _, params in group])
         except Exception as e:
-            logger.error(f"Ошибка обновления статуса в БД: {e}")
+            logger.error(f"Ошибка записи в БД ({len(batch)} операций): {e}")
 
     def register_url(
         self,
@@ -317,15 +444,20 @@ class MonitoringStateManager:
                 "config": config,
                 "error_count": 0,
                 "status": "active",  # active, paused, stopped
-                "registered_at": datetime.now(timezone.utc),
+                "registered_at": time.time(),
                 "started_at": time.time(),  # unix timestamp для фильтрации объявлений
                 "last_check": None,
                 "last_error": None,
                 "notifications_sent": 0,
                 "linked_task_id": None,
+                # config не меняется после регистрации — сериализуем для БД один раз
+                "_config_json": json.dumps(config, ensure_ascii=False),
             }
             self._monitored_urls[task_id] = url_data
+            self._url_locks[task_id] = threading.Lock()
+            self._reindex(task_id, url_data)
             self._metrics["total_registered"] += 1
+            self._urls_version += 1
 
         # Сохранение в БД (вне lock — IO операция)
         self._db_save(url_data)
@@ -343,8 +475,12 @@ class MonitoringStateManager:
         """
         with self._lock:
             if task_id in self._monitored_urls:
-                del self._monitored_urls[task_id]
+                url_data = self._monitored_urls.pop(task_id)
+                self._by_platform_status[(url_data["platform"], url_data["status"])].discard(task_id)
+                self._url_locks.pop(task_id, None)
+                self._url_processors.pop(task_id, None)
                 self._metrics["total_stopped"] += 1
+                self._urls_version += 1
             else:
                 return False
 
@@ -358,28 +494,101 @@ class MonitoringStateManager:
                 self._monitored_urls[task_id1]["linked_task_id"] = task_id2
             if task_id2 in self._monitored_urls:
                 self._monitored_urls[task_id2]["linked_task_id"] = task_id1
+            self._urls_version += 1
 
         # Сохраняем в БД
-        try:
-            with sqlite3.connect(self._db_name) as conn:
-                conn.execute(
-                    "UPDATE monitored_urls SET linked_task_id = ? WHERE task_id = ?",
-                    (task_id2, task_id1)
-                )
-                conn.execute(
-                    "UPDATE monitored_urls SET linked_task_id = ? WHERE task_id = ?",
-                    (task_id1, task_id2)
-                )
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Ошибка сохранения linked_task_id: {e}")
+        self._enqueue(_SQL["update_link"], (task_id2, task_id1))
+        self._enqueue(_SQL["update_link"], (task_id1, task_id2))
+
+    def register_url_processor(self, task_id: str, builder: Callable[[], Any]) -> Any:
+        """
+        Спецификация обработки URL, построенная один раз на задачу
+
+        Конфиг фильтров задачи не меняется после регистрации, поэтому монитор
+        строит spec (конфиг фильтров, парсер) при первом обращении, а дальше
+        получает готовый. Сбрасывается при unregister_url.
+
+        Args:
+            task_id: ID задачи
+            builder: Функция без аргументов, строящая spec
+
+        Returns:
+            Any: Закэшированный spec
+        """
+        with self._lock:
+            spec = self._url_processors.get(task_id)
+        if spec is not None:
+            return spec
+
+        spec = builder()
+        with self._lock:
+            # Задача могла быть удалена, пока строился spec — не кэшируем
+            if task_id in self._monitored_urls:
+                spec = self._url_processors.setdefault(task_id, spec)
+        return spec
 
     def get_url_data(self, task_id: str) -> Optional[dict]:
         """Получение данных URL"""
+        # Без _lock: dict.get и копия записи атомарны под GIL, а устаревшее
+        # на момент возврата значение — и так контракт этого метода
+        url_data = self._monitored_urls.get(task_id)
+        return self._url_view(url_data) if url_data else None
+
+    def _reindex(self, task_id: str, url_data: dict):
+        """
+        Перенести task_id в корзину индекса по текущему статусу (под _lock)
+
+        Статус читается в момент переиндексации, поэтому при гонке
+        pause/resume последний вызов всегда оставляет индекс согласованным.
+        """
+        platform = url_data["platform"]
+        for (bucket_platform, _), task_ids in self._by_platform_status.items():
+            if bucket_platform == platform:
+                task_ids.discard(task_id)
+        self._by_platform_status[(platform, url_data["status"])].add(task_id)
+
+    def _entries_with_status(self, status: str, platform: Optional[str] = None) -> List[dict]:
+        """Записи реестра с данным статусом (и платформой) по индексу (под _lock)"""
+        return [
+            self._monitored_urls[task_id]
+            for (bucket_platform, bucket_status), task_ids in self._by_platform_status.items()
+            if bucket_status == status and platform in (None, bucket_platform)
+            for task_id in task_ids
+        ]
+
+    def _entry(self, task_id: str):
+        """Запись реестра и её lock: (url_data, lock) или (None, None)"""
         with self._lock:
-            return self._monitored_urls.get(task_id)
+            return self._monitored_urls.get(task_id), self._url_locks.get(task_id)
+
+    @staticmethod
+    def _snapshot(url_data: dict) -> UrlSnapshot:
+        """Снимок записи без копирования всего dict"""
+        return UrlSnapshot(
+            url_data["task_id"],
+            url_data["url"],
+            url_data["platform"],
+            url_data["user_id"],
+            url_data["config"],
+            url_data["status"],
+            url_data["started_at"],
+        )
 
-    def get_urls_for_platform(self, platform: str) -> List[dict]:
+    @staticmethod
+    def _url_view(url_data: dict) -> dict:
+        """Копия url_data для выдачи наружу: timestamp'ы переведены в datetime"""
+        view = url_data.copy()
+        del view["_config_json"]
+        for key in _URL_TS_FIELDS:
+            view[key] = _to_datetime(view[key])
+        return view
+
+    @property
+    def urls_version(self) -> int:
+        """Версия набора активных URL (меняется при register/unregister/pause/resume)"""
+        return self._urls_version
+
+    def get_urls_for_platform(self, platform: str) -> List[UrlSnapshot]:
         """
         Получение всех активных URL для платформы
 
@@ -387,24 +596,17 @@ class MonitoringStateManager:
             platform: "avito" или "cian"
 
         Returns:
-            List[dict]: Список данных URL
+            List[UrlSnapshot]: Снимки активных URL
         """
         with self._lock:
-            return [
-                url_data.copy()
-                for url_data in self._monitored_urls.values()
-                if url_data["platform"] == platform.lower()
-                   and url_data["status"] == "active"
-            ]
-
-    def get_all_active_urls(self) -> List[dict]:
+            entries = self._entries_with_status("active", platform.lower())
+        return [self._snapshot(url_data) for url_data in entries]
+
+    def get_all_active_urls(self) -> List[UrlSnapshot]:
         """Получение всех активных URL"""
         with self._lock:
-            return [
-                url_data.copy()
-                for url_data in self._monitored_urls.values()
-                if url_data["status"] == "active"
-            ]
+            entries = self._entries_with_status("active")
+        return [self._snapshot(url_data) for url_data in entries]
 
     def increment_error(self, task_id: str, error_msg: str = None) -> Optional[dict]:
         """
@@ -416,81 +618,99 @@ class MonitoringStateManager:
             Снимок url_data если задача только что приостановлена, иначе None.
             Используется вызывающим кодом для отправки уведомления.
         """
-        paused_snapshot = None
-        with self._lock:
-            if task_id not in self._monitored_urls:
-                return None
+        url_data, url_lock = self._entry(task_id)
+        if url_data is None:
+            return None
 
-            url_data = self._monitored_urls[task_id]
+        paused_snapshot = None
+        now = time.time()
+        with url_lock:
             url_data["error_count"] += 1
             url_data["last_error"] = error_msg
-            url_data["last_check"] = datetime.now(timezone.utc)
+            url_data["last_check"] = now
 
+            # Паузим после 5 ошибок
+            if url_data["error_count"] >= 5:
+                url_data["status"] = "paused"
+                paused_snapshot = self._url_view(url_data)
+
+        with self._lock:
             self._metrics["total_errors"] += 1
             self._metrics["last_error"] = {
                 "task_id": task_id,
                 "error": error_msg,
-                "timestamp": datetime.now(timezone.utc)
+                "timestamp": now
             }
-
-            # Паузим после 5 ошибок
-            if url_data["error_count"] >= 5:
-                url_data["status"] = "paused"
-                paused_snapshot = url_data.copy()
-                logger.warning(
-                    f"URL {url_data['url']} приостановлен после 5 ошибок"
-                )
+            if paused_snapshot:
+                self._reindex(task_id, url_data)
+                self._urls_version += 1
 
         if paused_snapshot:
+            logger.warning(
+                f"URL {url_data['url']} приостановлен после 5 ошибок"
+            )
             self._db_update_status(task_id, "paused")
 
         return paused_snapshot
 
     def record_check(self, task_id: str, new_items_count: int = 0):
-        """Запись результата успешной проверки: сброс ошибок, обновление статистики"""
-        last_check_ts = None
-        notif_count = None
-        with self._lock:
-            if task_id not in self._monitored_urls:
-                return
-            url_data = self._monitored_urls[task_id]
+        """
+        Запись результата успешной проверки: сброс ошибок, обновление статистики
+
+        В БД статистика попадает пачкой через flush() — здесь только память.
+        """
+        url_data, url_lock = self._entry(task_id)
+        if url_data is None:
+            return
+        with url_lock:
             url_data["error_count"] = 0
-            url_data["last_check"] = datetime.now(timezone.utc)
+            url_data["last_check"] = time.time()
             url_data["notifications_sent"] = url_data.get("notifications_sent", 0) + new_items_count
-            last_check_ts = url_data["last_check"].timestamp()
-            notif_count = url_data["notifications_sent"]
-        self._db_update_check_stats(task_id, last_check_ts, notif_count)
+            row = (url_data["last_check"], url_data["notifications_sent"])
+        with self._pending_lock:
+            self._pending_checks[task_id] = row
+            full = len(self._pending_checks) >= FLUSH_BATCH_SIZE
+        if full:
+            self._flush_wakeup.set()
 
     def pause_url(self, task_id: str):
         """Приостановка мониторинга URL"""
+        url_data, url_lock = self._entry(task_id)
+        if url_data is None:
+            return
+        with url_lock:
+            url_data["status"] = "paused"
         with self._lock:
-            if task_id in self._monitored_urls:
-                self._monitored_urls[task_id]["status"] = "paused"
-            else:
-                return
+            self._reindex(task_id, url_data)
+            self._urls_version += 1
         self._db_update_status(task_id, "paused")
 
     def resume_url(self, task_id: str):
         """Возобновление мониторинга URL"""
+        url_data, url_lock = self._entry(task_id)
+        if url_data is None:
+            return
+        with url_lock:
+            url_data["status"] = "active"
+            url_data["error_count"] = 0
         with self._lock:
-            if task_id in self._monitored_urls:
-                self._monitored_urls[task_id]["status"] = "active"
-                self._monitored_urls[task_id]["error_count"] = 0
-            else:
-                return
+            self._reindex(task_id, url_data)
+            self._urls_version += 1
         self._db_update_status(task_id, "active")
 
     def get_metrics(self) -> dict:
         """Получение метрик мониторинга"""
         with self._lock:
-            active_count = sum(
-                1 for url in self._monitored_urls.values()
-                if url["status"] == "active"
-            )
-            paused_count = sum(
-                1 for url in self._monitored_urls.values()
-                if url["status"] == "paused"
-            )
+            active_count = paused_count = 0
+            for (_, status), task_ids in self._by_platform_status.items():
+                if status == "active":
+                    active_count += len(task_ids)
+                elif status == "paused":
+                    paused_count += len(task_ids)
+
+            last_error = self._metrics["last_error"]
+            if last_error:
+                last_error = {**last_error, "timestamp": _to_datetime(last_error["timestamp"])}
 
             return {
                 "total_monitored": len(self._monitored_urls),
@@ -499,14 +719,13 @@ class MonitoringStateManager:
                 "total_registered": self._metrics["total_registered"],
                 "total_stopped": self._metrics["total_stopped"],
                 "total_errors": self._metrics["total_errors"],
-                "last_error": self._metrics["last_error"]
+                "last_error": last_error
             }
 
     def get_status(self, task_id: str) -> Optional[str]:
-        """Получение статуса URL"""
-        with self._lock:
-            url_data = self._monitored_urls.get(task_id)
-            return url_data["status"] if url_data else None
+        """Получение статуса URL (без lock — см. get_url_data)"""
+        url_data = self._monitored_urls.get(task_id)
+        return url_data["status"] if url_data else None
 
     def stop_all_tasks(self):
         """
@@ -516,19 +735,24 @@ class MonitoringStateManager:
         статусов всех задач в БД. Пишет 'suspended' — отдельный статус
         для рестарта, чтобы не смешивать с 'paused' (ошибки).
         """
-        with self._lock:
-            active_tasks = [
-                task_id for task_id, data in self._monitored_urls.items()
-                if data["status"] in ("active", "paused")
-            ]
+        # Останавливаем флашер (будим, чтобы не ждать интервал) и дописываем очередь
+        # сами — в ней могут быть регистрации и смены статусов
+        self._flush_stop.set()
+        self._flush_wakeup.set()
+        self._flush_thread.join()
+        self.flush()
 
         # 'suspended' — остановлено из-за рестарта, восстановится автоматически.
-        # 'paused' — остановлено из-за ошибок, не трогаем.
-        for task_id in active_tasks:
-            self._db_update_status(task_id, "suspended")
+        # Одним UPDATE в одной транзакции вместо запроса на каждую задачу
+        try:
+            with self._db_lock, self._transaction() as conn:
+                suspended = conn.execute(_SQL["suspend_all"]).rowcount
+        except Exception as e:
+            logger.error(f"Ошибка перевода задач в 'suspended': {e}")
+            return 0
 
-        logger.info(f"🛑 Graceful shutdown: {len(active_tasks)} задач переведено в 'suspended' (восстановятся после рестарта)")
-        return len(active_tasks)
+        logger.info(f"🛑 Graceful shutdown: {suspended} задач переведено в 'suspended' (восстановятся после рестарта)")
+        return suspended
 
 
 # Глобальные экземпляры
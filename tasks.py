@@ -8,12 +8,17 @@ tasks.py - Legacy код для старого режима парсинга (Ph
 """
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Dict, Any
 from loguru import logger
 from state_manager import task_manager
 from models_api import SourceType
 from dto import AvitoConfig, CianConfig
 
+# Общий пул потоков парсинга вместо пары новых потоков на каждую задачу;
+# заодно ограничивает число одновременных парсеров
+_PARSER_EXEC = ThreadPoolExecutor(max_workers=16, thread_name_prefix="parser")
+
 
 def run_avito_parsing(task_id: str, avito_url: str, pages: int,
                       notification_bot_token: str, notification_chat_id: int,
@@ -133,33 +138,24 @@ def run_parsing_task(
             "cian": None
         }
 
-        threads = []
+        futures = []
 
-        # ✅ ЗАПУСКАЕМ AVITO В ОТДЕЛЬНОМ ПОТОКЕ
+        # ✅ ЗАПУСКАЕМ AVITO В ПУЛЕ ПАРСЕРОВ
         if avito_url:
-            avito_thread = threading.Thread(
-                target=run_avito_parsing,
-                args=(task_id, avito_url, pages, notification_bot_token,
-                      notification_chat_id, stop_event, results),
-                name=f"avito-{task_id}"
-            )
-            avito_thread.start()
-            threads.append(avito_thread)
-
-        # ✅ ЗАПУСКАЕМ CIAN В ОТДЕЛЬНОМ ПОТОКЕ (ОДНОВРЕМЕННО!)
+            futures.append(_PARSER_EXEC.submit(
+                run_avito_parsing, task_id, avito_url, pages, notification_bot_token,
+                notification_chat_id, stop_event, results
+            ))
+
+        # ✅ ЗАПУСКАЕМ CIAN В ПУЛЕ ПАРСЕРОВ (ОДНОВРЕМЕННО!)
         if cian_url:
-            cian_thread = threading.Thread(
-                target=run_cian_parsing,
-                args=(task_id, cian_url, pages, notification_bot_token,
-                      notification_chat_id, stop_event, results),
-                name=f"cian-{task_id}"
-            )
-            cian_thread.start()
-            threads.append(cian_thread)
-
-        # ✅ ЖДЁМ ЗАВЕРШЕНИЯ ОБОИХ ПОТОКОВ
-        for thread in threads:
-            thread.join()
+            futures.append(_PARSER_EXEC.submit(
+                run_cian_parsing, task_id, cian_url, pages, notification_bot_token,
+                notification_chat_id, stop_event, results
+            ))
+
+        # ✅ ЖДЁМ ЗАВЕРШЕНИЯ ОБОИХ ПАРСЕРОВ
+        wait(futures)
 
         # --- ЗАВЕРШЕНИЕ ---
         if stop_event.is_set():
@@ -1,6 +1,9 @@
+import random
 import requests
+from requests.adapters import HTTPAdapter
 import time
-import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from loguru import logger
 
@@ -8,6 +11,36 @@ from models import Item
 from cian_models import CianItem
 from typing import Union
 
+# orjson быстрее stdlib и на ответах API, и на сериализации payload;
+# без него работает json из stdlib
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+# Экранирование спецсимволов MarkdownV2 (кроме *) и замена неразрывного пробела
+# одним проходом str.translate вместо re.sub
+_MDV2_TABLE = str.maketrans({
+    **{c: "\\" + c for c in "_[]()~`>#+-=|{}.!"},
+    "\xa0": " ",
+})
+
+
+@lru_cache(maxsize=4096)
+def _escape_mdv2(text: str) -> str:
+    """Кешированное экранирование: заголовки, адреса и цены в ленте повторяются."""
+    return text.translate(_MDV2_TABLE)
+
+
+# Получатели обслуживаются параллельно: время рассылки ≈ один RTT, а не N.
+# Ограниченный пул заодно не даёт превысить лимиты API на одного бота
+_SEND_EXEC = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tg-send")
+
+# Потолок экспоненциальной паузы между повторами, сек
+MAX_RETRY_DELAY = 60
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
 
 class SendAdToTg:
     def __init__(self, bot_token: str, chat_id: list, max_retries: int = 5, retry_delay: int = 5):
@@ -16,14 +49,16 @@ class SendAdToTg:
         self.api_url = f"https://api.telegram.org/bot{self.bot_token}/sendPhoto"
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        # Keep-alive: соединение с api.telegram.org переиспользуется между сообщениями
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
 
     @staticmethod
     def escape_markdown(text: str) -> str:
         """Экранирует спецсимволы MarkdownV2, кроме """
         if not text:
             return ""
-        text = str(text).replace("\xa0", " ")
-        return re.sub(r'([_\[\]()~`>#+\-=|{}.!])', r'\\\1', text)
+        return _escape_mdv2(str(text))
 
     @staticmethod
     def get_first_image(ad: Union[Item, CianItem]):
@@ -33,84 +68,66 @@ class SendAdToTg:
             if not ad.images:
                 return None
 
-            def get_largest_image_url(img):
-                # Фильтруем только ключи формата "WxH" — Avito иногда добавляет
-                # нестандартные ключи типа "catalog", которые ломают int()
-                valid_keys = [
-                    k for k in img.root.keys()
-                    if "x" in k
-                    and k.split("x")[0].isdigit()
-                    and k.split("x")[1].isdigit()
-                ]
-                if not valid_keys:
-                    return str(next(iter(img.root.values())))
-                best_key = max(
-                    valid_keys,
-                    key=lambda k: int(k.split("x")[0]) * int(k.split("x")[1])
-                )
-                return str(img.root[best_key])
-
-            images_urls = [get_largest_image_url(img) for img in ad.images]
-            if images_urls:
-                return images_urls[0]
+            return ad.images[0].largest_url
 
         # Для Cian - изображений в списках нет
         # Можно вернуть плейсхолдер или None
         return None
 
+    @staticmethod
+    def _avito_fields(ad: Item) -> tuple:
+        """Экранированные поля объявления Avito для format_ad"""
+        esc = SendAdToTg.escape_markdown
+
+        price = esc(str(ad.priceDetailed.value)) if ad.priceDetailed else ""
+        title = esc(ad.title) if ad.title else ""
+        url = f"https://avito.ru/{ad.urlPath}" if ad.urlPath else ""
+        is_promoted = getattr(ad, "isPromotion", False)
+
+        # Площадь
+        area_text = ""
+        if ad.total_meters and ad.total_meters > 0:
+            area_text = f"📐 {esc(str(ad.total_meters))} м²"
+
+        # Адрес
+        address_text = ""
+        if ad.geo and ad.geo.formattedAddress:
+            # Убираем лишнее из адреса (например "Россия, ")
+            address = ad.geo.formattedAddress
+            if address.startswith("Россия, "):
+                address = address[8:]  # Убираем "Россия, "
+            address_text = f"📍 {esc(address)}"
+
+        return "🔵 Avito", price, title, url, is_promoted, area_text, address_text
+
+    @staticmethod
+    def _cian_fields(ad: CianItem) -> tuple:
+        """Экранированные поля объявления Cian для format_ad"""
+        esc = SendAdToTg.escape_markdown
+
+        price = esc(str(ad.price.value)) if ad.price.value else ""
+        title = esc(ad.title) if ad.title else ""
+        url = ad.url  # URL не экранируем - он в скобках ссылки
+
+        # Площадь - ЭКРАНИРУЕМ!
+        area_text = f"📐 {esc(str(ad.total_meters))} м²" if ad.total_meters > 0 else ""
+
+        address_text = ""
+        if ad.location_data and ad.location_data.full_address:
+            address_text = f"📍 {esc(ad.location_data.full_address)}"
+
+        return "🟢 Cian", price, title, url, False, area_text, address_text
+
+    # Разбор полей по точному типу объявления — один поиск в dict вместо цепочки isinstance
+    _FIELDS = {Item: _avito_fields, CianItem: _cian_fields}
+
     @staticmethod
     def format_ad(ad: Union[Item, CianItem]) -> str:
         """Форматирует объявление для Telegram (поддерживает Avito и Cian)"""
-
-        def esc(text: str) -> str:
-            if not text:
-                return ""
-            s = str(text).replace("\xa0", " ")
-            return re.sub(r'([_\[\]()~`>#+\-=|{}.!])', r'\\\1', s)
-
-        # Определяем источник и извлекаем данные
-        if isinstance(ad, Item):  # Avito
-            price = esc(str(ad.priceDetailed.value)) if ad.priceDetailed else ""
-            title = esc(ad.title) if ad.title else ""
-            url = f"https://avito.ru/{ad.urlPath}" if ad.urlPath else ""
-            seller = esc(str(ad.sellerId)) if ad.sellerId else ""
-            is_promoted = getattr(ad, "isPromotion", False)
-            source = "🔵 Avito"
-
-            # Площадь
-            area_text = ""
-            if ad.total_meters and ad.total_meters > 0:
-                area_text = f"\n📐 {esc(str(ad.total_meters))} м²"
-
-            # Адрес
-            address_text = ""
-            if ad.geo and ad.geo.formattedAddress:
-                # Убираем лишнее из адреса (например "Россия, ")
-                address = ad.geo.formattedAddress
-                if address.startswith("Россия, "):
-                    address = address[8:]  # Убираем "Россия, "
-                address_text = f"\n📍 {esc(address)}"
-
-        elif isinstance(ad, CianItem):  # Cian
-            price = esc(str(ad.price.value)) if ad.price.value else ""
-            title = esc(ad.title) if ad.title else ""
-            url = ad.url  # URL не экранируем - он в скобках ссылки
-            seller = esc(ad.author.name) if ad.author.name else ""
-            is_promoted = False
-            source = "🟢 Cian"
-
-            # Площадь - ЭКРАНИРУЕМ!
-            if ad.total_meters > 0:
-                area_text = f"\n📐 {esc(str(ad.total_meters))} м²"
-            else:
-                area_text = ""
-
-            address_text = ""
-            if ad.location_data and ad.location_data.full_address:
-                address_text = f"\n📍 {esc(ad.location_data.full_address)}"
-
-        else:
+        fields = SendAdToTg._FIELDS.get(type(ad))
+        if fields is None:
             return "Неизвестный тип объявления"
+        source, price, title, url, is_promoted, area_text, address_text = fields(ad)
 
         # Формируем сообщение
         parts = []
@@ -146,8 +163,13 @@ class SendAdToTg:
         message = "\n".join(parts)
         return message
 
-    def __send_to_tg(self, chat_id: str | int, ad: Union[Item, CianItem] = None, msg: str = None):
-        """Отправляет сообщение в Telegram"""
+    def __send_to_tg(self, chat_id: str | int, ad: Union[Item, CianItem] = None, msg: str = None,
+                     message: str = None, image_url: str = None):
+        """Отправляет сообщение в Telegram
+
+        message/image_url — уже подготовленные format_ad/get_first_image, чтобы
+        не пересчитывать их для каждого получателя.
+        """
         if msg:
             # Текстовое сообщение
             payload = {
@@ -155,25 +177,26 @@ class SendAdToTg:
                 "text": msg,
                 "parse_mode": "MarkdownV2",
             }
-            return requests.post(f"https://api.telegram.org/bot{self.bot_token}/sendMessage", json=payload)
+            return self._post_json(f"https://api.telegram.org/bot{self.bot_token}/sendMessage", payload)
 
         # Объявление
-        message = self.format_ad(ad)
-        _image_url = self.get_first_image(ad=ad)
+        if message is None:
+            message = self.format_ad(ad)
+            image_url = self.get_first_image(ad=ad)
 
         for attempt in range(1, self.max_retries + 1):
             response = None  # ← ИНИЦИАЛИЗИРУЕМ!
             try:
-                if _image_url:
+                if image_url:
                     # С изображением
                     payload = {
                         "chat_id": chat_id,
                         "caption": message,
-                        "photo": _image_url,
+                        "photo": image_url,
                         "parse_mode": "MarkdownV2",
                         "disable_web_page_preview": True,
                     }
-                    response = requests.post(self.api_url, json=payload)
+                    response = self._post_json(self.api_url, payload)
                 else:
                     # Без изображения (только текст)
                     payload = {
@@ -182,13 +205,13 @@ class SendAdToTg:
                         "parse_mode": "MarkdownV2",
                         "disable_web_page_preview": False,
                     }
-                    response = requests.post(f"https://api.telegram.org/bot{self.bot_token}/sendMessage", json=payload)
+                    response = self._post_json(f"https://api.telegram.org/bot{self.bot_token}/sendMessage", payload)
 
                 # Проверяем статус
                 if response.status_code == 400:
                     logger.warning("Ошибка 400 от Telegram API")
                     try:
-                        error_data = response.json()
+                        error_data = _json.loads(response.content)
                         logger.error(f"Детали ошибки: {error_data}")
                         logger.error(f"Сообщение которое пытались отправить:\n{message}")
                     except Exception as parse_err:
@@ -213,11 +236,37 @@ class SendAdToTg:
                 logger.debug(f"Сообщение:\n{message}")
 
                 if attempt < self.max_retries:
-                    time.sleep(self.retry_delay)
+                    time.sleep(self._retry_pause(attempt, response))
                 else:
                     logger.debug("Не удалось отправить сообщение после всех попыток.")
 
+    def _post_json(self, url: str, payload: dict) -> requests.Response:
+        """POST с телом, сериализованным orjson (вместо json.dumps внутри requests)"""
+        return self.session.post(url, data=_json.dumps(payload), headers=_JSON_HEADERS)
+
+    def _retry_pause(self, attempt: int, response) -> float:
+        """Пауза перед повтором: retry_after из ответа 429, иначе экспонента с джиттером"""
+        if response is not None and response.status_code == 429:
+            try:
+                return float(_json.loads(response.content)["parameters"]["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                pass
+        return min(self.retry_delay * 2 ** (attempt - 1), MAX_RETRY_DELAY) + random.uniform(0, 1)
+
     def send_to_tg(self, ad: Union[Item, CianItem] = None, msg: str = None):
         """Отправляет объявление или сообщение всем получателям"""
-        for chat_id in self.chat_id:
-            self.__send_to_tg(chat_id=chat_id, ad=ad, msg=msg)
\ No newline at end of file
+        message = image_url = None
+        if not msg:
+            # Форматируем объявление один раз на всех получателей
+            message = self.format_ad(ad)
+            image_url = self.get_first_image(ad=ad)
+        if len(self.chat_id) <= 1:
+            for chat_id in self.chat_id:
+                self.__send_to_tg(chat_id=chat_id, ad=ad, msg=msg, message=message, image_url=image_url)
+            return
+        futures = [
+            _SEND_EXEC.submit(self.__send_to_tg, chat_id=chat_id, ad=ad, msg=msg, message=message, image_url=image_url)
+            for chat_id in self.chat_id
+        ]
+        for future in futures:
+            future.result()
@@ -1,6 +1,10 @@
+import random
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import time
-import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from loguru import logger
 
@@ -8,6 +12,42 @@ from models import Item
 from cian_models import CianItem
 from typing import Union
 
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+# Собраны один раз на модуль, а не на каждый вызов
+_NBSP_TABLE = str.maketrans({"\xa0": " "})
+# Экранирование MarkdownV2 и замена неразрывного пробела — один проход str.translate
+_MDV2_TABLE = str.maketrans({
+    **{c: "\\" + c for c in "_[]()~`>#+-=|{}.!"},
+    "\xa0": " ",
+})
+
+
+@lru_cache(maxsize=4096)
+def _escape_mdv2(text: str) -> str:
+    """Кешированное экранирование: заголовки и имена продавцов в ленте повторяются."""
+    return text.translate(_MDV2_TABLE)
+
+
+def _clean(text) -> str:
+    """Текст поля без неразрывных пробелов."""
+    if not text:
+        return ""
+    return str(text).translate(_NBSP_TABLE)
+
+
+# Пул для параллельной рассылки по user_id (см. send_to_vk)
+_SEND_EXEC = ThreadPoolExecutor(max_workers=8, thread_name_prefix="vk-send")
+
+# Коды VK API о превышении частоты: 6 — too many requests per second, 9 — flood control
+RATE_LIMIT_ERRORS = frozenset({6, 9})
+MAX_RETRY_DELAY = 60
+# Сколько переиспользуется адрес из photos.getMessagesUploadServer, сек
+UPLOAD_URL_TTL = 3600
+
 
 class SendAdToVK:
     def __init__(self, vk_token: str, user_id: list, max_retries: int = 5, retry_delay: int = 5):
@@ -16,14 +56,21 @@ class SendAdToVK:
         self.api_url = "https://api.vk.com/method/messages.send"
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        # Одна сессия на обработчик: keep-alive и пул соединений вместо нового TLS на каждый запрос.
+        # Токен не кладём в session.headers — через ту же сессию качаются фото со сторонних CDN
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+        self._auth_headers = {"Authorization": f"Bearer {self.vk_token}"}
+        self._upload_url = None
+        self._upload_url_expires = 0.0
+        self._upload_url_lock = threading.Lock()
 
     @staticmethod
     def escape_markdown(text: str) -> str:
         """Экранирует спецсимволы MarkdownV2, кроме """
         if not text:
             return ""
-        text = str(text).replace("\xa0", " ")
-        return re.sub(r'([_\[\]()~`>#+\-=|{}.!])', r'\\\1', text)
+        return _escape_mdv2(str(text))
 
     @staticmethod
     def get_first_image(ad: Union[Item, CianItem]):
@@ -33,47 +80,41 @@ class SendAdToVK:
             if not ad.images:
                 return None
 
-            def get_largest_image_url(img):
-                best_key = max(
-                    img.root.keys(),
-                    key=lambda k: int(k.split("x")[0]) * int(k.split("x")[1])
-                )
-                return str(img.root[best_key])
-
-            images_urls = [get_largest_image_url(img) for img in ad.images]
-            if images_urls:
-                return images_urls[0]
+            return ad.images[0].largest_url
 
         # Для Cian - изображений в списках нет
         return None
 
+    @staticmethod
+    def _avito_fields(ad: Item) -> tuple:
+        """Источник, цена, название, URL, продавец, поднято, площадь — для format_ad"""
+        price = _clean(str(ad.priceDetailed.value)) if ad.priceDetailed else ""
+        title = _clean(ad.title) if ad.title else ""
+        url = f"https://avito.ru/{ad.urlPath}" if ad.urlPath else ""
+        seller = _clean(str(ad.sellerId)) if ad.sellerId else ""
+        is_promoted = getattr(ad, "isPromotion", False)
+        return "🔵 Avito", price, title, url, seller, is_promoted, ""
+
+    @staticmethod
+    def _cian_fields(ad: CianItem) -> tuple:
+        """То же для Cian"""
+        price = _clean(str(ad.price.value)) if ad.price.value else ""
+        title = _clean(ad.title) if ad.title else ""
+        seller = _clean(ad.author.name) if ad.author.name else ""
+        # Площадь показываем только для Cian
+        area = f"📐 Площадь: {ad.total_meters} м²" if ad.total_meters > 0 else ""
+        return "🟢 Cian", price, title, ad.url, seller, False, area
+
+    # Поиск по type(ad) вместо цепочки isinstance
+    _FIELDS = {Item: _avito_fields, CianItem: _cian_fields}
+
     @staticmethod
     def format_ad(ad: Union[Item, CianItem]) -> str:
         """Форматирует объявление для VK (простой текст, поддерживает Avito и Cian)"""
-
-        def clean(text: str) -> str:
-            if not text:
-                return ""
-            return str(text).replace("\xa0", " ")
-
-        # Определяем источник и извлекаем данные
-        if isinstance(ad, Item):  # Avito
-            price = clean(str(ad.priceDetailed.value)) if ad.priceDetailed else ""
-            title = clean(ad.title) if ad.title else ""
-            url = f"https://avito.ru/{ad.urlPath}" if ad.urlPath else ""
-            seller = clean(str(ad.sellerId)) if ad.sellerId else ""
-            is_promoted = getattr(ad, "isPromotion", False)
-            source = "🔵 Avito"
-
-        elif isinstance(ad, CianItem):  # Cian
-            price = clean(str(ad.price.value)) if ad.price.value else ""
-            title = clean(ad.title) if ad.title else ""
-            url = ad.url
-            seller = clean(ad.author.name) if ad.author.name else ""
-            is_promoted = False
-            source = "🟢 Cian"
-        else:
+        fields = SendAdToVK._FIELDS.get(type(ad))
+        if fields is None:
             return "Неизвестный тип объявления"
+        source, price, title, url, seller, is_promoted, area = fields(ad)
 
         # Формируем сообщение
         parts = []
@@ -92,9 +133,9 @@ class SendAdToVK:
         if title:
             parts.append(f"📦 {title}")
 
-        # Площадь (только для Cian)
-        if isinstance(ad, CianItem) and ad.total_meters > 0:
-            parts.append(f"📐 Площадь: {ad.total_meters} м²")
+        # Площадь
+        if area:
+            parts.append(area)
 
         # Продавец
         if seller:
@@ -107,37 +148,54 @@ class SendAdToVK:
         message = "\n".join(parts)
         return message
 
-    def __upload_photo_to_vk(self, photo_url: str, user_id: str) -> str | None:
-        """Загружает фото по URL и возвращает attachment для messages.send"""
-        headers = {"Authorization": f"Bearer {self.vk_token}"}
+    def _get_upload_url(self) -> str | None:
+        """Адрес сервера загрузки фото; кешируется на UPLOAD_URL_TTL.
 
-        try:
-            # Шаг 1: Получаем URL для загрузки
-            upload_server_response = requests.post(
+        Под локом: параллельные отправки (пул _SEND_EXEC) обновляют его один раз.
+        """
+        with self._upload_url_lock:
+            if self._upload_url and time.monotonic() < self._upload_url_expires:
+                return self._upload_url
+
+            upload_server_response = _json.loads(self.session.post(
                 "https://api.vk.com/method/photos.getMessagesUploadServer",
-                headers=headers,
+                headers=self._auth_headers,
                 data={"v": "5.199"}
-            ).json()
+            ).content)
 
             if "error" in upload_server_response:
                 logger.warning(f"VK upload server error: {upload_server_response['error']}")
                 return None
 
-            upload_url = upload_server_response["response"]["upload_url"]
+            self._upload_url = upload_server_response["response"]["upload_url"]
+            self._upload_url_expires = time.monotonic() + UPLOAD_URL_TTL
+            return self._upload_url
+
+    def __upload_photo_to_vk(self, photo_url: str, user_id: str) -> str | None:
+        """Загружает фото по URL и возвращает attachment для messages.send"""
+        headers = self._auth_headers
 
-            # Шаг 2: Скачиваем фото и загружаем на VK
-            photo_data = requests.get(photo_url, timeout=10).content
-            upload_response = requests.post(
+        try:
+            # Шаг 1: Получаем URL для загрузки
+            upload_url = self._get_upload_url()
+            if not upload_url:
+                return None
+
+            # Шаг 2: Скачиваем фото и загружаем на VK (страницу ошибки фото не отправляем)
+            photo = self.session.get(photo_url, timeout=10)
+            photo.raise_for_status()
+            upload_response = _json.loads(self.session.post(
                 upload_url,
-                files={"photo": ("photo.jpg", photo_data, "image/jpeg")}
-            ).json()
+                files={"photo": ("photo.jpg", photo.content, "image/jpeg")}
+            ).content)
 
             if not upload_response.get("photo") or upload_response.get("photo") == "[]":
                 logger.warning("VK: фото не загружено")
+                self._upload_url = None  # адрес мог протухнуть — в следующий раз запросим новый
                 return None
 
             # Шаг 3: Сохраняем фото
-            save_response = requests.post(
+            save_response = _json.loads(self.session.post(
                 "https://api.vk.com/method/photos.saveMessagesPhoto",
                 headers=headers,
                 data={
@@ -146,7 +204,7 @@ class SendAdToVK:
                     "hash": upload_response["hash"],
                     "v": "5.199"
                 }
-            ).json()
+            ).content)
 
             if "error" in save_response:
                 logger.warning(f"VK save photo error: {save_response['error']}")
@@ -162,11 +220,10 @@ class SendAdToVK:
             logger.warning(f"Error uploading photo to VK: {e}")
             return None
 
-    def __send_to_vk(self, user_id: str | int, ad: Union[Item, CianItem] = None, msg: str = None):
-        """Отправляет сообщение в VK"""
-        headers = {
-            "Authorization": f"Bearer {self.vk_token}"
-        }
+    def __send_to_vk(self, user_id: str | int, ad: Union[Item, CianItem] = None, msg: str = None,
+                     message: str = None, image_url: str = None):
+        """Отправляет сообщение в VK (message/image_url готовит send_to_vk, общие для всех user_id)"""
+        headers = self._auth_headers
 
         if msg:
             # Текстовое сообщение
@@ -176,16 +233,17 @@ class SendAdToVK:
                 "message": msg,
                 "v": "5.199"
             }
-            return requests.post(self.api_url, headers=headers, data=payload)
+            return self.session.post(self.api_url, headers=headers, data=payload)
 
         # Объявление
-        message = self.format_ad(ad)
-        _image_url = self.get_first_image(ad=ad)
+        if message is None:
+            message = self.format_ad(ad)
+            image_url = self.get_first_image(ad=ad)
 
         # Загружаем фото если есть
         attachment = None
-        if _image_url:
-            attachment = self.__upload_photo_to_vk(_image_url, str(user_id))
+        if image_url:
+            attachment = self.__upload_photo_to_vk(image_url, str(user_id))
 
         for attempt in range(1, self.max_retries + 1):
             try:
@@ -198,35 +256,54 @@ class SendAdToVK:
                 if attachment:
                     payload["attachment"] = attachment
 
-                logger.info(payload)
-                response = requests.post(self.api_url, headers=headers, data=payload)
+                logger.opt(lazy=True).debug("VK payload: {}", lambda: payload)
+                response = self.session.post(self.api_url, headers=headers, data=payload)
 
                 if response.status_code != 200:
                     logger.warning("Не удалось отправить сообщение. Проверьте правильность введенных данных")
                     break
 
-                body = response.json()
+                body = _json.loads(response.content)
                 if "error" in body:
                     error_msg = body["error"].get("error_msg", "Unknown error")
                     error_code = body["error"].get("error_code", 0)
                     logger.warning(f"VK API error {error_code}: {error_msg}")
 
                     if attempt < self.max_retries:
-                        time.sleep(self.retry_delay)
+                        if error_code in RATE_LIMIT_ERRORS:
+                            time.sleep(self._backoff(attempt))
+                        else:
+                            time.sleep(self.retry_delay)
                         continue
                     break
 
                 logger.debug(f"Сообщение успешно отправлено (попытка {attempt})")
                 break
-            except requests.RequestException as e:
+            except (requests.RequestException, ValueError) as e:
                 logger.debug(f"Ошибка при отправке (попытка {attempt}): {e}")
                 logger.debug(message)
                 if attempt < self.max_retries:
-                    time.sleep(self.retry_delay)
+                    time.sleep(self._backoff(attempt))
                 else:
                     logger.debug("Не удалось отправить сообщение после всех попыток.")
 
+    def _backoff(self, attempt: int) -> float:
+        """retry_delay, удваивающийся с каждой попыткой (до MAX_RETRY_DELAY), плюс джиттер"""
+        return min(self.retry_delay * 2 ** (attempt - 1), MAX_RETRY_DELAY) + random.uniform(0, 1)
+
     def send_to_vk(self, ad: Union[Item, CianItem] = None, msg: str = None):
         """Отправляет объявление или сообщение всем получателям"""
-        for user_id in self.user_id:
-            self.__send_to_vk(user_id=user_id, ad=ad, msg=msg)
\ No newline at end of file
+        message = image_url = None
+        if not msg:
+            message = self.format_ad(ad)
+            image_url = self.get_first_image(ad=ad)
+        if len(self.user_id) <= 1:
+            for user_id in self.user_id:
+                self.__send_to_vk(user_id=user_id, ad=ad, msg=msg, message=message, image_url=image_url)
+            return
+        futures = [
+            _SEND_EXEC.submit(self.__send_to_vk, user_id=user_id, ad=ad, msg=msg, message=message, image_url=image_url)
+            for user_id in self.user_id
+        ]
+        for future in futures:
+            future.result()
@@ -6,15 +6,32 @@ from models import Item
 from cian_models import CianItem
 from typing import Union
 
+# Через сколько пачек объявлений книга сохраняется на диск
+SAVE_EVERY_BATCHES = 10
+
+# Часовой пояс хоста определяется один раз, а не на каждую строку
+_LOCAL_TZ = get_localzone()
+
+# Колонки адреса Cian, когда location_data нет
+_NO_LOCATION = ("",) * 6
+
 
 class XLSXHandler:
-    """Сохраняет информацию в xlsx (поддерживает Avito и Cian)"""
+    """Сохраняет информацию в xlsx (поддерживает Avito и Cian)
+
+    Книга держится открытой между пачками и сохраняется раз в SAVE_EVERY_BATCHES
+    пачек или по flush(): load_workbook + save на каждую пачку перечитывают и
+    переписывают весь растущий файл.
+    """
 
     def __init__(self, file_name):
         self._initialize(file_name=file_name)
 
     def _initialize(self, file_name):
         self.file_name = file_name
+        self._workbook = None
+        self._sheet = None
+        self._unsaved_batches = 0
         os.makedirs("result", exist_ok=True)
         if not os.path.exists(self.file_name):
             self._create_file()
@@ -50,11 +67,12 @@ class XLSXHandler:
             "Просмотры (сегодня)",  # Для Avito
         ])
         workbook.save(self.file_name)
+        self._workbook, self._sheet = workbook, sheet
 
     @staticmethod
     def get_ad_time(ad: Item):
         """Получает время публикации (только для Avito)"""
-        return datetime.fromtimestamp(ad.sortTimeStamp / 1000, tz=get_localzone()).replace(tzinfo=None)
+        return datetime.fromtimestamp(ad.sortTimeStamp / 1000, tz=_LOCAL_TZ).replace(tzinfo=None)
 
     @staticmethod
     def get_item_coords(ad: Item) -> str:
@@ -72,40 +90,41 @@ class XLSXHandler:
 
     def append_data_from_page(self, ads: list[Union[Item, CianItem]]):
         """Добавляет данные из списка объявлений (Avito или Cian)"""
-        workbook = load_workbook(self.file_name)
-        sheet = workbook.active
+        if self._workbook is None:
+            self._workbook = load_workbook(self.file_name)
+            self._sheet = self._workbook.active
 
-        for ad in ads:
-            if isinstance(ad, Item):  # Avito
-                row = self._format_avito_row(ad)
-            elif isinstance(ad, CianItem):  # Cian
-                row = self._format_cian_row(ad)
-            else:
-                continue  # Неизвестный тип - пропускаем
+        # Форматтер по типу объявления; неизвестные типы пропускаем
+        formatters = {Item: self._format_avito_row, CianItem: self._format_cian_row}
+        rows = [fmt(ad) for ad in ads if (fmt := formatters.get(type(ad)))]
 
-            sheet.append(row)
+        append = self._sheet.append
+        for row in rows:
+            append(row)
 
-        workbook.save(self.file_name)
+        self._unsaved_batches += 1
+        if self._unsaved_batches >= SAVE_EVERY_BATCHES:
+            self.flush()
+
+    def flush(self):
+        """Сохраняет накопленные пачки в файл"""
+        if self._workbook is not None and self._unsaved_batches:
+            self._workbook.save(self.file_name)
+            self._unsaved_batches = 0
 
     def _format_avito_row(self, ad: Item) -> list:
         """Форматирует строку для Avito"""
 
         # Получаем изображения
-        def get_largest_image_url(img):
-            best_key = max(
-                img.root.keys(),
-                key=lambda k: int(k.split("x")[0]) * int(k.split("x")[1])
-            )
-            return str(img.root[best_key])
-
-        images_urls = [get_largest_image_url(img) for img in ad.images] if ad.images else []
+        images_urls = [img.largest_url for img in ad.images] if ad.images else []
 
         # Получаем полный адрес
+        geo, location = ad.geo, ad.location
         full_address = ""
-        if ad.geo and ad.geo.formattedAddress:
-            full_address = ad.geo.formattedAddress
-        elif ad.location and ad.location.name:
-            full_address = ad.location.name
+        if geo and geo.formattedAddress:
+            full_address = geo.formattedAddress
+        elif location and location.name:
+            full_address = location.name
 
         return [
             "Avito",  # Источник
@@ -119,7 +138,7 @@ class XLSXHandler:
             ad.sellerId if ad.sellerId else "",  # Продавец
             "",  # Тип автора (нет у Avito в таком виде)
             full_address,
-            ad.location.name if ad.location else "",  # Адрес (город)
+            location.name if location else "",  # Адрес (город)
             "",  # Округ (нет у Avito)
             "",  # Район (нет структурировано)
             "",  # Метро (нет структурировано)
@@ -135,6 +154,12 @@ class XLSXHandler:
 
     def _format_cian_row(self, ad: CianItem) -> list:
         """Форматирует строку для Cian"""
+        author, ld = ad.author, ad.location_data
+        # Округ, район, метро, удалённость, улица, дом
+        location_cols = (
+            ld.district_okrug, ld.district, ld.underground,
+            ld.metro_remoteness, ld.street, ld.house_number,
+        ) if ld else _NO_LOCATION
         return [
             "Cian",  # Источник
             ad.id,  # ID
@@ -144,15 +169,10 @@ class XLSXHandler:
             ad.url,  # URL
             ad.description[:500] if ad.description else "",  # Описание (обрезаем)
             "",  # Дата публикации (нет у Cian в списке)
-            ad.author.name if ad.author else "",  # Автор
-            ad.author.type if ad.author else "",  # Тип автора
+            author.name if author else "",  # Автор
+            author.type if author else "",  # Тип автора
             ad.location,  # Адрес (город)
-            ad.location_data.district_okrug if ad.location_data else "",  # Округ
-            ad.location_data.district if ad.location_data else "",  # Район
-            ad.location_data.underground if ad.location_data else "",  # Метро
-            ad.location_data.metro_remoteness if ad.location_data else "",  # Удалённость
-            ad.location_data.street if ad.location_data else "",  # Улица
-            ad.location_data.house_number if ad.location_data else "",  # Дом
+            *location_cols,  # Округ, Район, Метро, Удалённость, Улица, Дом
             "",  # Координаты (нет в списке)
             "",  # Изображения (нет в списке)
             "",  # Поднято (нет у Cian)